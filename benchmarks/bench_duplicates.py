@@ -0,0 +1,67 @@
+# benchmarks/bench_duplicates.py
+#
+# Possible duplicate runners in a synthetic series class: the indexed
+# candidate search in series_result._similarNames against fuzz.ratio on
+# every pair. Stops if the two find different pairs.
+#
+# Usage: python benchmarks/bench_duplicates.py [names]
+
+import os, sys
+import itertools
+import random
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fuzzywuzzy import fuzz
+from losttime.views.series_result import _similarNames, DUPLICATE_NAME_RATIO
+
+SYLLABLES = ['an', 'ber', 'ca', 'dor', 'el', 'fin', 'ga', 'hal', 'is', 'jo', 'ka', 'lin',
+             'mar', 'ne', 'ol', 'per', 'qui', 'ros', 'sa', 'tor', 'ul', 'van', 'wil', 'yo', 'zed']
+MISSPELLED = 0.05 # share of runners entered again with a typo
+
+
+def name(rand):
+    first = ''.join(rand.choice(SYLLABLES) for i in range(rand.randint(1, 3)))
+    last = ''.join(rand.choice(SYLLABLES) for i in range(rand.randint(2, 4)))
+    return '{} {}'.format(first.capitalize(), last.capitalize())
+
+
+def typo(rand, s):
+    i = rand.randrange(len(s))
+    return rand.choice([s[:i] + s[i+1:],
+                        s[:i] + rand.choice('aeiourstln') + s[i:],
+                        s[:i] + s[i+1:i+2] + s[i:i+1] + s[i+2:]])
+
+
+def names(count, seed=1):
+    rand = random.Random(seed)
+    result = []
+    while len(result) < count:
+        if result and rand.random() < MISSPELLED:
+            result.append(typo(rand, rand.choice(result)))
+        else:
+            result.append(name(rand))
+    return result
+
+
+def main(count=5000):
+    class_names = names(count)
+
+    start = time.perf_counter()
+    indexed = _similarNames(class_names)
+    t1 = time.perf_counter() - start
+
+    start = time.perf_counter()
+    allpairs = [(i, j) for i, j in itertools.combinations(range(count), 2)
+                if fuzz.ratio(class_names[i], class_names[j]) > DUPLICATE_NAME_RATIO]
+    t0 = time.perf_counter() - start
+
+    if indexed != allpairs:
+        sys.exit('indexed search found {} pairs, all pairs found {}'.format(len(indexed), len(allpairs)))
+    print('{} names, {} possible duplicates'.format(count, len(indexed)))
+    print('all pairs: {0:.2f} s, indexed: {1:.2f} s ({2:.0f}x)'.format(t0, t1, t0/t1))
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 5000)
@@ -0,0 +1,112 @@
+# benchmarks/bench_indexes.py
+#
+# Query plans and timings for the hot lookups, with and without the indexes
+# declared in losttime/models.py, on a synthetic sqlite database.
+#
+# Usage: python benchmarks/bench_indexes.py [events]
+
+import os, sys
+import random
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from losttime import app, db
+from losttime.models import Event, EventClass, PersonResult, EventTeamClass, TeamResult
+
+CLASSES_PER_EVENT = 12
+RESULTS_PER_CLASS = 25
+TEAMS_PER_EVENT = 20
+REPEAT = 50
+
+
+def populate(numevents, seed=1):
+    rand = random.Random(seed)
+    db.session.execute(Event.__table__.insert(), [
+        {'id': e, 'ltuserid': rand.randint(1, 50), 'name': 'Event {}'.format(e),
+         'isProcessed': True, 'replacedbyid': None if rand.random() < 0.8 else e + 1}
+        for e in range(1, numevents+1)])
+    classes = []
+    results = []
+    teams = []
+    for e in range(1, numevents+1):
+        for c in range(CLASSES_PER_EVENT):
+            classid = len(classes) + 1
+            classes.append({'id': classid, 'eventid': e, 'name': 'Class {}'.format(c),
+                            'shortname': 'C{}'.format(c), 'scoremethod': 'worldcup'})
+            for r in range(RESULTS_PER_CLASS):
+                results.append({'eventid': e, 'classid': classid, 'name': 'Runner {}'.format(r),
+                                'club_shortname': 'CL{}'.format(r % 8), 'coursestatus': 'ok',
+                                'resultstatus': 'ok', 'time': rand.randint(1200, 5400),
+                                'position': r + 1, 'score': 100 - r})
+        for t in range(TEAMS_PER_EVENT):
+            teams.append({'eventid': e, 'teamclassid': e, 'teamname_short': 'CL{}'.format(t),
+                          'position': t + 1, 'score': 300 - t})
+    db.session.execute(EventTeamClass.__table__.insert(), [
+        {'id': e, 'eventid': e, 'shortname': 'WT', 'name': 'Teams'} for e in range(1, numevents+1)])
+    db.session.execute(EventClass.__table__.insert(), classes)
+    db.session.execute(PersonResult.__table__.insert(), results)
+    db.session.execute(TeamResult.__table__.insert(), teams)
+    db.session.commit()
+
+
+def lookups(numevents):
+    eventid = numevents // 2
+    classid = eventid * CLASSES_PER_EVENT
+    return [
+        ('PersonResult by event', PersonResult.query.filter_by(eventid=eventid)),
+        ('PersonResult by event+class', PersonResult.query.filter_by(eventid=eventid).filter_by(classid=classid)),
+        ('PersonResult by class list', PersonResult.query.filter(PersonResult.classid.in_([classid, classid+1, classid+2]))),
+        ('EventClass by event', EventClass.query.filter_by(eventid=eventid)),
+        ('EventTeamClass by event', EventTeamClass.query.filter_by(eventid=eventid)),
+        ('TeamResult by teamclass', TeamResult.query.filter_by(teamclassid=eventid)),
+        ('TeamResult by event', TeamResult.query.filter_by(eventid=eventid)),
+        ('Event by user', Event.query.filter_by(ltuserid=7, replacedbyid=None, isProcessed=True)),
+        ('Event by replacedbyid', Event.query.filter_by(replacedbyid=eventid)),
+    ]
+
+
+def measure(numevents):
+    rows = []
+    for label, query in lookups(numevents):
+        sql = str(query.statement.compile(db.engine, compile_kwargs={'literal_binds': True}))
+        plan = '; '.join(r[-1] for r in db.session.execute('EXPLAIN QUERY PLAN ' + sql))
+        start = time.perf_counter()
+        for i in range(REPEAT):
+            query.all()
+        elapsed = (time.perf_counter() - start) / REPEAT
+        rows.append((label, elapsed, plan))
+    return rows
+
+
+def main(numevents=500):
+    dbfile = tempfile.NamedTemporaryFile(suffix='.db', delete=False).name
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///' + dbfile
+    try:
+        with app.app_context():
+            db.create_all()
+            populate(numevents)
+            indexes = [ix for table in db.metadata.sorted_tables for ix in table.indexes]
+
+            for ix in indexes:
+                ix.drop(db.engine)
+            before = measure(numevents)
+            for ix in indexes:
+                ix.create(db.engine)
+            db.session.execute('ANALYZE')
+            after = measure(numevents)
+            db.session.remove()
+            db.engine.dispose()
+    finally:
+        os.remove(dbfile)
+
+    print('{} events, {} person results'.format(numevents, numevents * CLASSES_PER_EVENT * RESULTS_PER_CLASS))
+    for (label, t0, plan0), (_, t1, plan1) in zip(before, after):
+        print('{0}: {1:.2f} ms -> {2:.2f} ms ({3:.0f}x)'.format(label, t0*1000, t1*1000, t0/t1))
+        print('    before: {}'.format(plan0))
+        print('    after:  {}'.format(plan1))
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 500)
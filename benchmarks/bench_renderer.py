@@ -0,0 +1,144 @@
+# benchmarks/bench_renderer.py
+#
+# Render time and peak memory of the result pages with the dominate and
+# stream renderers on a synthetic event and series. Stops if the two
+# renderers do not produce the same html.
+#
+# Usage: python benchmarks/bench_renderer.py [results per class]
+
+import os, sys
+import random
+import time
+import tracemalloc
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from losttime.models import Event, EventClass, PersonResult, EventTeamClass, TeamResult, ClubCode, Series, SeriesClass
+from losttime.views._output_templates import EventHtmlWriter, SeriesHtmlWriter
+
+SCOREMETHODS = ['worldcup', '1000pts', 'time', 'score', 'score1000', 'alpha']
+STATUSES = [('ok', 'ok'), ('ok', 'ok'), ('ok', 'ok'), ('mp', 'ok'), ('dnf', 'ok'),
+            ('ok', 'nc'), ('dnf', 'dsq'), ('ok', 'dns')]
+CLUBS = ['CL{}'.format(i) for i in range(12)]
+NAMES = ['Ann & Bo', 'Cy <Dee>', 'Eve "E" Fay', "Gus O'Hare", 'Ida Jo', 'Kai Lu']
+SERIES_EVENTS = 6
+REPEAT = 5
+
+
+def build_event(perclass, seed=1):
+    """Model objects for one event, never added to a session"""
+    rand = random.Random(seed)
+    event = Event('Bench & Test <Event>', datetime(2020, 1, 1), 'Park', 'Club')
+    classes = []
+    results = []
+    shortnames = ['W1F', 'W2M', 'W6F', 'W6M', 'M21', 'F21', 'M40', 'F40', 'B', 'Y']
+    for i, shortname in enumerate(shortnames):
+        ec = EventClass(1, 'Class {}'.format(shortname), shortname, SCOREMETHODS[i % len(SCOREMETHODS)])
+        ec.id = i + 1
+        classes.append(ec)
+        for j in range(perclass):
+            coursestatus, resultstatus = rand.choice(STATUSES)
+            pr = PersonResult(1, ec.id, 1000 + j, '{} {}'.format(rand.choice(NAMES), j), None,
+                              rand.choice(CLUBS + [None]), coursestatus, resultstatus,
+                              rand.randint(1200, 5400), {'points': rand.randint(0, 60), 'penalty': rand.randint(0, 10)})
+            pr.id = len(results) + 1
+            pr.position = j + 1 if resultstatus == 'ok' else -1
+            pr.score = None if resultstatus == 'nc' else float(100 - min(j, 99))
+            results.append(pr)
+    teamclasses = []
+    teamresults = []
+    teammembers = {}
+    for i, shortname in enumerate(['WT6F', 'WT6M']):
+        tc = EventTeamClass(1, shortname, 'Team {}'.format(shortname), 'wiol')
+        tc.id = i + 1
+        teamclasses.append(tc)
+        for j, club in enumerate(CLUBS):
+            tr = TeamResult(1, tc.id, club, float(300 - j), 5, 4 - j % 3)
+            tr.id = len(teamresults) + 1
+            tr.position = j + 1
+            teamresults.append(tr)
+            teammembers[tr.id] = [r.id for r in results if r.club_shortname == club][:3]
+    clubcodes = {}
+    for club in CLUBS[:8]:
+        clubcodes.setdefault(club, []).append(ClubCode('COC', club, 'School of {}'.format(club)))
+    return event, classes, results, teamclasses, teamresults, clubcodes, teammembers
+
+
+def build_series(perclass, seed=2):
+    """SeriesHtmlWriter arguments shaped like series_result._calculateSeries output"""
+    rand = random.Random(seed)
+    series = Series()
+    series.scoreeventscount = SERIES_EVENTS - 2
+    eventids = list(range(1, SERIES_EVENTS + 1))
+    seriesclasses = []
+    seriesresults = {}
+    for i, shortname in enumerate(['M21', 'F21', 'WT6F']):
+        sc = SeriesClass(1, 'Series {}'.format(shortname), shortname, 'team' if shortname.startswith('WT') else 'indv')
+        seriesclasses.append(sc)
+        rows = []
+        for j in range(perclass):
+            row = {'name': CLUBS[j % len(CLUBS)] if sc.classtype == 'team' else '{} {}'.format(rand.choice(NAMES), j),
+                   'club': rand.choice(CLUBS + [None]), 'results': {}}
+            for eid in eventids:
+                if rand.random() < 0.8:
+                    pr = PersonResult(eid, 1, None, row['name'], None, row['club'], 'ok', 'ok', 3600)
+                    pr.score = float(rand.randint(50, 100))
+                    pr.position = rand.randint(1, 10)
+                    row['results'][eid] = pr
+                else:
+                    row['results'][eid] = False
+            row['scores'] = sorted([r.score for r in row['results'].values() if r], reverse=True)
+            row['score'] = sum(row['scores'][:series.scoreeventscount])
+            row['position'] = j + 1
+            rows.append(row)
+        seriesresults[shortname] = rows
+    clubcodes = {club: [ClubCode('COC', club, 'School of {}'.format(club))] for club in CLUBS}
+    return series, seriesclasses, seriesresults, clubcodes, eventids
+
+
+def pages(perclass):
+    """(label, function(renderer) -> html) for every page the writers make"""
+    event = build_event(perclass)
+    series = build_series(perclass)
+    def eventpage(style, team):
+        def render(renderer):
+            writer = EventHtmlWriter(event[0], style, *[list(x) if isinstance(x, list) else x for x in event[1:]])
+            doc = writer.eventResultTeam(renderer) if team else writer.eventResultIndv(renderer)
+            return doc.render()
+        return render
+    def seriespage(renderer):
+        s, seriesclasses, seriesresults, clubcodes, eventids = series
+        writer = SeriesHtmlWriter(s, 'coc', list(seriesclasses), seriesresults, clubcodes, eventids)
+        return writer.seriesResult(renderer).render()
+    return [('event generic', eventpage('generic', False)),
+            ('event coc', eventpage('coc', False)),
+            ('event team', eventpage('generic', True)),
+            ('series coc', seriespage)]
+
+
+def measure(render, renderer):
+    start = time.perf_counter()
+    for i in range(REPEAT):
+        html = render(renderer)
+    elapsed = (time.perf_counter() - start) / REPEAT
+    tracemalloc.start()
+    render(renderer)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return html, elapsed, peak
+
+
+def main(perclass=200):
+    print('{} results per class'.format(perclass))
+    for label, render in pages(perclass):
+        html0, t0, m0 = measure(render, 'dominate')
+        html1, t1, m1 = measure(render, 'stream')
+        if html0 != html1:
+            sys.exit('{}: stream html differs from dominate html'.format(label))
+        print('{0}: {1:.1f} ms -> {2:.1f} ms ({3:.1f}x), peak {4:.1f} MB -> {5:.1f} MB, {6} bytes identical'.format(
+            label, t0*1000, t1*1000, t0/t1, m0/2**20, m1/2**20, len(html0)))
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 200)
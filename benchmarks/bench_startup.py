@@ -0,0 +1,60 @@
+# benchmarks/bench_startup.py
+#
+# What a new worker pays to start: wall time and peak memory of
+# `import losttime` in fresh interpreters, and which of the heavy libraries
+# the views only need later got loaded anyway.
+#
+# Usage: python benchmarks/bench_startup.py [--repeat N] [--json out.json]
+
+import os, sys
+import argparse
+import json
+import statistics
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+LAZY = ['numpy', 'dominate', 'fuzzywuzzy', 'pytz', 'weasyprint',
+        'losttime.views._output_templates', 'losttime.views._scoring']
+
+# run in each fresh interpreter, prints one json line
+CHILD = '''
+import json, resource, sys, time, warnings
+warnings.filterwarnings('ignore')
+started = time.perf_counter()
+import losttime
+seconds = time.perf_counter() - started
+print(json.dumps({'seconds': seconds,
+                  'maxrss_kb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+                  'loaded': [m for m in %r if m in sys.modules]}))
+''' % (LAZY,)
+
+
+def run_once():
+    out = subprocess.check_output([sys.executable, '-c', CHILD], cwd=ROOT)
+    return json.loads(out.decode().strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Time import losttime in fresh interpreters')
+    parser.add_argument('--repeat', type=int, default=10, help='interpreters to start')
+    parser.add_argument('--json', help='save the timings to this file')
+    args = parser.parse_args()
+
+    run_once() # the first start also compiles .pyc files
+    runs = [run_once() for i in range(args.repeat)]
+    seconds = [r['seconds'] for r in runs]
+    rss = [r['maxrss_kb'] for r in runs]
+    loaded = runs[-1]['loaded']
+    print('import losttime  {0:8.1f} ms  (min {1:.1f})'.format(statistics.median(seconds) * 1000, min(seconds) * 1000))
+    print('peak rss         {0:8.1f} MB'.format(statistics.median(rss) / 1024))
+    print('loaded at start  {0}'.format(', '.join(loaded) if loaded else 'none of ' + ', '.join(LAZY)))
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'python': sys.version.split()[0], 'repeat': args.repeat,
+                       'results': {'import': {'min': min(seconds), 'median': statistics.median(seconds), 'runs': seconds}},
+                       'maxrss_kb': statistics.median(rss), 'loaded': loaded}, f, indent=1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,269 @@
+# benchmarks/bench_suite.py
+#
+# Times each stage results and entries go through on race night, on
+# synthetic files from benchmarks/generators.py and an in-memory sqlite
+# database: reading uploads, upload_event, scoring, split analysis, result
+# pages, series standings and the entry manager. The timings can be saved
+# as json and two saved runs compared, so a regression shows up before a
+# meet does.
+#
+# Usage: python benchmarks/bench_suite.py [--scale N] [--repeat N] [--json out.json]
+#        python benchmarks/bench_suite.py --compare before.json after.json
+
+import os, sys
+import argparse
+import contextlib
+import json
+import platform
+import statistics
+import subprocess
+import tempfile
+import time
+import warnings
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+warnings.filterwarnings('ignore') # fuzzywuzzy asks for python-Levenshtein on import
+
+from generators import CLUBS, write_resultlist, write_oescore, write_registrations
+from losttime import app, db
+
+BASE_URL = 'https://localhost' # skips the ssl redirect
+SLOWER = 1.10 # --compare flags stages whose median grew past this ratio
+
+
+def sizes(scale):
+    return {'classes': 12, 'perclass': 40 * scale,
+            'score_classes': 4, 'score_perclass': 100 * scale,
+            'series_events': 6, 'entries': 1000 * scale}
+
+
+def configure(workdir):
+    """Point the app at an in-memory database and keep all work in the request"""
+    app.config.update(SQLALCHEMY_DATABASE_URI='sqlite://', TESTING=True, SECRET_KEY='bench',
+                      JOB_WORKERS=0, PDF_WORKERS=0, PARSE_CACHE_BYTES=0)
+    app.instance_path = os.path.join(workdir, 'instance')
+    # upload_event saves to a path relative to the repository root
+    os.chdir(ROOT)
+
+
+def write_files(workdir, sz):
+    files = {'xml': os.path.join(workdir, 'event.xml'),
+             'oescore': os.path.join(workdir, 'score.csv'),
+             'entries': os.path.join(workdir, 'entries.csv')}
+    write_resultlist(files['xml'], sz['classes'], sz['perclass'])
+    write_oescore(files['oescore'], sz['score_classes'], sz['score_perclass'])
+    write_registrations(files['entries'], sz['entries'])
+    for e in range(1, sz['series_events'] + 1):
+        files['series{}'.format(e)] = os.path.join(workdir, 'series{}.xml'.format(e))
+        write_resultlist(files['series{}'.format(e)], sz['classes'], sz['perclass'], event=e)
+    return files
+
+
+def run_suite(workdir, sz, repeat):
+    from losttime.models import Event, EventClass, PersonResult, ClubCode, Series, SeriesEvent, SeriesClass, SeriesClassMember, SeriesStanding
+    from losttime.views._orienteer_data import OrienteerResultReader
+    from losttime.views._scoring import scoreEvent
+    from losttime.views._splits import analyzeSplits, eventSplits
+    from losttime.views._output_templates import SeriesHtmlWriter, EntryWriter
+    from losttime.views._club_codes import getClubCodes, invalidateClubCodes
+    from losttime.views.event_result import _bulkInsertEvent, _assignTeamScores, _buildResultPages
+    from losttime.views.series_result import _calculateSeries, _getSeriesEventIds, _writeSeriesPage, update_series_for_replaced_event
+
+    files = write_files(workdir, sz)
+    results = {}
+    quiet = open(os.devnull, 'w') # team scoring prints every club without starters
+
+    def record(name, fn):
+        runs = []
+        for i in range(repeat):
+            with contextlib.redirect_stdout(quiet):
+                start = time.perf_counter()
+                fn()
+                runs.append(time.perf_counter() - start)
+        results[name] = {'min': min(runs), 'median': statistics.median(runs), 'runs': runs}
+        print('{0:<32} {1:>10.1f} ms  (min {2:.1f})'.format(name, results[name]['median'] * 1000, results[name]['min'] * 1000))
+
+    def read(path, score, stream):
+        reader = OrienteerResultReader(path, score, stream=stream)
+        return reader.getEventMeta(), list(reader.iterEventClassPersonResults())
+
+    record('reader.xml.stream', lambda: read(files['xml'], False, True))
+    record('reader.xml.tree', lambda: read(files['xml'], False, False))
+    record('reader.oescore', lambda: read(files['oescore'], True, False))
+
+    with app.app_context():
+        db.create_all()
+        db.session.add_all([ClubCode('COC', club, 'Club {}'.format(club)) for club in CLUBS])
+        db.session.commit()
+        invalidateClubCodes()
+
+    client = app.test_client()
+    uploaded = []
+    def upload(path, eventtype):
+        with open(path, 'rb') as f:
+            r = client.post('/event-result/upload', base_url=BASE_URL,
+                            data={'event-type': eventtype, 'eventFile': (f, os.path.basename(path))})
+        if r.status_code != 201:
+            raise RuntimeError('upload_event answered {}: {}'.format(r.status_code, r.data[:200]))
+        uploaded.append(r.get_json()['eventid'])
+
+    record('upload_event.xml', lambda: upload(files['xml'], 'standard'))
+    eventid = uploaded[-1]
+    record('upload_event.oescore', lambda: upload(files['oescore'], 'score'))
+    scoreid = uploaded[-1]
+    app.config['PARSE_CACHE_BYTES'] = 64 * 2**20
+    upload(files['xml'], 'standard')
+    record('upload_event.xml.cached', lambda: upload(files['xml'], 'standard'))
+    app.config['PARSE_CACHE_BYTES'] = 0
+
+    # flash() in the series and entry code needs a request
+    with app.test_request_context():
+        for eid, methods in [(eventid, ['worldcup', '1000pts', 'time']), (scoreid, ['score', 'score1000'])]:
+            for i, ec in enumerate(EventClass.query.filter_by(eventid=eid).order_by(EventClass.id)):
+                ec.scoremethod = methods[i % len(methods)]
+        db.session.commit()
+
+        record('scoreEvent', lambda: scoreEvent(eventid))
+        record('scoreEvent.scoreO', lambda: scoreEvent(scoreid))
+        record('assignTeamScores.wiol', lambda: _assignTeamScores(eventid, 'wiol'))
+        record('analyzeSplits', lambda: analyzeSplits(eventid))
+        record('eventSplits', lambda: eventSplits(eventid))
+        for renderer in ['dominate', 'stream']:
+            app.config['HTML_RENDERER'] = renderer
+            record('EventHtmlWriter.' + renderer,
+                   lambda: [doc.render() for doc in _buildResultPages(eventid, 'coc').values()])
+
+        def series_event(e):
+            meta, classresults = read(files['series{}'.format(e)], False, True)
+            eid = _bulkInsertEvent(Event(meta.name, meta.date, meta.venue, None), classresults, False)
+            for ec in EventClass.query.filter_by(eventid=eid):
+                ec.scoremethod = 'worldcup'
+            # every tenth runner has no club, replaceSeriesEvent checks their standings survive
+            PersonResult.query.filter(PersonResult.eventid == eid, PersonResult.bib.like('%0')). \
+                update({'club_shortname': None}, synchronize_session=False)
+            db.session.commit()
+            with contextlib.redirect_stdout(quiet):
+                scoreEvent(eid)
+                _assignTeamScores(eid, 'wiol')
+            return eid
+        eventids = [series_event(e) for e in range(1, sz['series_events'] + 1)]
+        series = Series()
+        series.name = 'Synthetic Series'
+        series.scoremethod = 'sum'
+        series.scoreeventscount = sz['series_events'] - 2
+        series.scoreeventsneeded = 1
+        series.scoretiebreak = 'scoring'
+        series.outputformat = 'coc'
+        db.session.add(series)
+        db.session.flush()
+        seriesid = series.id
+        db.session.add_all([SeriesEvent(seriesid, eid, i) for i, eid in enumerate(eventids)])
+        for ec in EventClass.query.filter(EventClass.eventid.in_(eventids)).order_by(EventClass.id):
+            sc = SeriesClass.query.filter_by(seriesid=seriesid, shortname=ec.shortname).first()
+            if sc is None:
+                sc = SeriesClass(seriesid, ec.name, ec.shortname, 'indv')
+                db.session.add(sc)
+                db.session.flush()
+            db.session.add(SeriesClassMember(sc.id, ec.id))
+        db.session.commit()
+
+        seriesresults = {}
+        def calculate():
+            seriesresults.update(_calculateSeries(seriesid))
+        record('calculateSeries', calculate)
+        for renderer in ['dominate', 'stream']:
+            record('SeriesHtmlWriter.' + renderer, lambda: SeriesHtmlWriter(
+                Series.query.get(seriesid), 'coc', SeriesClass.query.filter_by(seriesid=seriesid).all(),
+                seriesresults, getClubCodes(), _getSeriesEventIds(seriesid)).seriesResult(renderer).render())
+
+        # replace the first event again and again with fresh uploads of the same file,
+        # each replacement also rewrites the series page
+        _writeSeriesPage(Series.query.get(seriesid), 'coc', seriesresults)
+        db.session.commit()
+        replacements = [series_event(1) for i in range(repeat)]
+        replaced = [eventids[0]]
+        def replace():
+            update_series_for_replaced_event(replaced[-1], replacements[len(replaced) - 1])
+            replaced.append(replacements[len(replaced) - 1])
+        clubless = lambda: SeriesStanding.query.filter_by(seriesid=seriesid, club=None).count()
+        before = clubless()
+        record('replaceSeriesEvent', replace)
+        if clubless() != before:
+            raise RuntimeError('replacing an event lost standings of runners without a club: {} -> {}'.format(before, clubless()))
+        # an event replaced by one the series already has leaves the series
+        update_series_for_replaced_event(eventids[1], eventids[2])
+        if eventids[1] in _getSeriesEventIds(seriesid):
+            raise RuntimeError('replacing an event with one already in the series left it in the series')
+
+        outfile = os.path.join(workdir, 'EntryForOE.csv')
+        def entries_oe():
+            with open(outfile, 'w') as out:
+                EntryWriter([files['entries']], 'OE').writeEntries(out)
+        record('EntryWriter.oe', entries_oe)
+        record('EntryWriter.checkin', lambda: EntryWriter([files['entries']], 'CheckIn').writeEntries())
+    quiet.close()
+    return results
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT,
+                                       stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(beforefile, afterfile):
+    """Print median timings side by side, True if any stage got slower"""
+    with open(beforefile) as f:
+        before = json.load(f)
+    with open(afterfile) as f:
+        after = json.load(f)
+    print('{0:<32} {1:>12} {2:>12} {3:>7}'.format('', before.get('commit') or beforefile,
+                                                  after.get('commit') or afterfile, 'ratio'))
+    slower = False
+    for name in list(before['results']) + [n for n in after['results'] if n not in before['results']]:
+        b = before['results'].get(name, {}).get('median')
+        a = after['results'].get(name, {}).get('median')
+        if a is None or b is None:
+            print('{0:<32} {1:>12} {2:>12}'.format(name, '-' if b is None else '{:.1f} ms'.format(b * 1000),
+                                                  '-' if a is None else '{:.1f} ms'.format(a * 1000)))
+            continue
+        ratio = a / b
+        flag = '  slower' if ratio > SLOWER else ''
+        slower = slower or ratio > SLOWER
+        print('{0:<32} {1:>9.1f} ms {2:>9.1f} ms {3:>6.2f}x{4}'.format(name, b * 1000, a * 1000, ratio, flag))
+    if before.get('scale') != after.get('scale'):
+        print('note: runs used different --scale values')
+    return slower
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Time the result and entry pipelines on synthetic data')
+    parser.add_argument('--scale', type=int, default=1, help='multiplies the size of every synthetic file')
+    parser.add_argument('--repeat', type=int, default=5, help='timed runs per stage')
+    parser.add_argument('--json', help='save the timings to this file')
+    parser.add_argument('--compare', nargs=2, metavar=('BEFORE', 'AFTER'), help='compare two saved runs')
+    args = parser.parse_args()
+
+    if args.compare:
+        sys.exit(1 if compare(*args.compare) else 0)
+
+    sz = sizes(args.scale)
+    with tempfile.TemporaryDirectory() as workdir:
+        configure(workdir)
+        print('scale {0}: {1} xml results, {2} score-O results, {3} entries, {4} series events'.format(
+            args.scale, sz['classes'] * sz['perclass'], sz['score_classes'] * sz['score_perclass'],
+            sz['entries'], sz['series_events']))
+        results = run_suite(workdir, sz, args.repeat)
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'commit': git_commit(), 'python': platform.python_version(),
+                       'scale': args.scale, 'repeat': args.repeat, 'sizes': sz,
+                       'results': results}, f, indent=1)
+
+
+if __name__ == '__main__':
+    main()
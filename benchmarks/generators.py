@@ -0,0 +1,137 @@
+# benchmarks/generators.py
+#
+# Synthetic input files shaped like the ones clubs upload: IOF 3.0
+# ResultList xml, OEScore csv exports and registration csv for the entry
+# manager. The same arguments always write the same file.
+#
+# Usage: python benchmarks/generators.py <resultlist|oescore|registrations> <path> [size]
+
+import os, sys
+import random
+from xml.sax.saxutils import escape
+
+SYLLABLES = ['an', 'ber', 'ca', 'dor', 'el', 'fin', 'ga', 'hal', 'is', 'jo', 'ka', 'lin',
+             'mar', 'ne', 'ol', 'per', 'qui', 'ros', 'sa', 'tor', 'ul', 'van', 'wil', 'yo', 'zed']
+CLUBS = ['CL{}'.format(i) for i in range(16)]
+# WIOL class names first so team scoring has classes to work with
+CLASSES = ['W1F', 'W1M', 'W2F', 'W2M', 'W3F', 'W3M', 'W4F', 'W4M', 'W5F', 'W5M', 'W6F', 'W6M',
+           'W7F', 'W7M', 'W8F', 'W8M', 'M21', 'F21', 'M40', 'F40']
+XML_STATUSES = ['OK'] * 12 + ['MissingPunch', 'DidNotFinish', 'NotCompeting', 'Disqualified', 'DidNotStart']
+CONTROLS = 12
+ATTENDANCE = 0.8 # share of a class's runners at any one event
+
+
+def class_shortname(i):
+    return CLASSES[i] if i < len(CLASSES) else 'C{}'.format(i)
+
+
+def roster(count, seed=0):
+    """[(given, family, club)] for a pool of runners shared by every event"""
+    rand = random.Random(seed)
+    runners = []
+    for i in range(count):
+        given = ''.join(rand.choice(SYLLABLES) for j in range(rand.randint(1, 2))).capitalize()
+        family = ''.join(rand.choice(SYLLABLES) for j in range(rand.randint(2, 3))).capitalize()
+        runners.append((given, family, rand.choice(CLUBS)))
+    return runners
+
+
+def event_entrants(classes, perclass, event, seed):
+    """{class index: [(runner number, (given, family, club))]} at one event
+
+    Runner n always runs class n % classes, so results from different event
+    numbers line up the way a real series does.
+    """
+    runners = roster(classes * perclass, seed)
+    rand = random.Random('{}-{}'.format(seed, event))
+    entrants = {}
+    for n, runner in enumerate(runners):
+        if rand.random() < ATTENDANCE:
+            entrants.setdefault(n % classes, []).append((n, runner))
+    return entrants
+
+
+def write_resultlist(path, classes=12, perclass=40, event=1, seed=0):
+    """IOF 3.0 ResultList xml with split times, about 1.2 KB per result"""
+    rand = random.Random('{}-{}-times'.format(seed, event))
+    date = '2020-{:02d}-{:02d}'.format((event - 1) // 28 % 12 + 1, (event - 1) % 28 + 1)
+    entrants = event_entrants(classes, perclass, event, seed)
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write('<?xml version="1.0" encoding="UTF-8"?>\n')
+        f.write('<ResultList xmlns="http://www.orienteering.org/datastandard/3.0" '
+                'xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance" iofVersion="3.0" status="Complete">\n')
+        f.write('<Event><Name>Synthetic Event {0}</Name><StartTime><Date>{1}</Date></StartTime></Event>\n'.format(event, date))
+        for c in range(classes):
+            shortname = class_shortname(c)
+            f.write('<ClassResult><Class><Id>{0}</Id><Name>Class {1}</Name><ShortName>{1}</ShortName></Class>\n'.format(c, shortname))
+            for n, (given, family, club) in entrants.get(c, []):
+                status = rand.choice(XML_STATUSES)
+                seconds = rand.randint(1200, 5400)
+                splits = sorted(rand.sample(range(60, seconds), CONTROLS))
+                f.write('<PersonResult><Person><Name><Family>{0}</Family><Given>{1}</Given></Name></Person>'
+                        '<Organisation><Name>Club {2}</Name><ShortName>{2}</ShortName></Organisation>'
+                        '<Result><BibNumber>{3}</BibNumber><StartTime>{4}T10:00:00</StartTime>'
+                        '<Time>{5}</Time><Status>{6}</Status><ControlCard>{7}</ControlCard>'.format(
+                            escape(family), escape(given), club, 1000 + n, date, seconds, status, 200000 + n))
+                for i, split in enumerate(splits):
+                    missing = status == 'MissingPunch' and i == CONTROLS // 2
+                    f.write('<SplitTime{0}><ControlCode>{1}</ControlCode>{2}</SplitTime>'.format(
+                        ' status="Missing"' if missing else '', 31 + i,
+                        '' if missing else '<Time>{}</Time>'.format(split)))
+                f.write('</Result></PersonResult>\n')
+            f.write('</ClassResult>\n')
+        f.write('</ResultList>\n')
+
+
+def write_oescore(path, classes=4, perclass=100, event=1, seed=0):
+    """OEScore csv export of a score-O event"""
+    rand = random.Random('{}-{}-score'.format(seed, event))
+    entrants = event_entrants(classes, perclass, event, seed)
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write('OESco0012,Stno,Chip,Surname,First name,YB,S,nc,Start,Finish,Time,Classifier,'
+                'Club no.,Cl.name,City,Short,Long,Points,Score penalty\n')
+        for c in range(classes):
+            shortname = 'S{}'.format(c)
+            for n, (given, family, club) in entrants.get(c, []):
+                if rand.random() < 0.05:
+                    time, classifier = rand.choice(['dnf', 'mp']), '3'
+                else:
+                    seconds = rand.randint(1800, 4200)
+                    time, classifier = '{}:{:02d}'.format(seconds // 60, seconds % 60), '0'
+                points = rand.randint(0, 40) * 10
+                penalty = rand.choice([0, 0, 0, 10, 20, 50])
+                # the first column, under the OESco0012 marker, is always empty
+                f.write(',{0},{1},{2},{3},,,0,,,{4},{5},,Club {6},{6},{7},Score {7},{8},{9}\n'.format(
+                    1000 + n, 200000 + n, family, given, time, classifier, club, shortname, points, -penalty))
+
+
+def write_registrations(path, entries=1000, seed=0):
+    """Registration csv for the entry manager, some entries renting e-punches"""
+    rand = random.Random('{}-entries'.format(seed))
+    runners = roster(entries, seed)
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write('Bib,First Name,Last Name,Gender,YB,Club,Course,Card,Owed,Phone,EmergencyPhone,License\n')
+        for n, (given, family, club) in enumerate(runners):
+            f.write('{0},{1},{2},{3},{4},{5},{6},{7},{8},555-{9:04d},555-{10:04d},{11}\n'.format(
+                '' if rand.random() < 0.2 else 1000 + n, given, family, rand.choice('MF'),
+                rand.randint(1940, 2015), club, rand.choice(['White', 'Yellow', 'Orange', 'Brown', 'Green', 'Red', 'Blue']),
+                '' if rand.random() < 0.4 else 200000 + n, '' if rand.random() < 0.7 else rand.choice([5, 10, 15]),
+                rand.randint(0, 9999), rand.randint(0, 9999), 'LT{:04d}'.format(n) if rand.random() < 0.5 else ''))
+
+
+def main(kind, path, size):
+    if kind == 'resultlist':
+        write_resultlist(path, perclass=size)
+    elif kind == 'oescore':
+        write_oescore(path, perclass=size)
+    elif kind == 'registrations':
+        write_registrations(path, entries=size)
+    else:
+        sys.exit('unknown file kind {}'.format(kind))
+    print('{}: {} bytes'.format(path, os.path.getsize(path)))
+
+
+if __name__ == '__main__':
+    if len(sys.argv) < 3:
+        sys.exit('Usage: python benchmarks/generators.py <resultlist|oescore|registrations> <path> [size]')
+    main(sys.argv[1], sys.argv[2], int(sys.argv[3]) if len(sys.argv) > 3 else 100)
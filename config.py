@@ -3,4 +3,14 @@
 DEBUG = False
 TESTING = False
 SQLALCHEMY_ECHO = False
-SQLALCHEMY_TRACK_MODIFICATIONS = False
\ No newline at end of file
+SQLALCHEMY_TRACK_MODIFICATIONS = False
+JOB_WORKERS = 2 # processes for background jobs, 0 runs jobs in the request
+JOB_TIMEOUT_SECONDS = 30 * 60 # queued or running jobs older than this are marked failed
+HTML_RENDERER = 'stream' # result pages: 'stream' writes html text, 'dominate' builds a tag tree
+BROTLI_QUALITY = 9 # .br copies of result pages, 11 is a little smaller but many times slower to write
+PDF_WORKERS = 1 # processes for check-in sheet pdfs, 0 renders them in the request
+PDF_TIMEOUT_SECONDS = 5 * 60 # check-in sheets still unrendered after this are reported failed
+PARSE_CACHE_BYTES = 64 * 2**20 # parsed uploads kept on disk for re-uploads, 0 turns the cache off
+SLOW_REQUEST_SECONDS = 5 # requests and jobs slower than this log their stage timings as warnings
+SQL_AUDIT = False # development: warn about sql statements repeated in a request and enforce @query_budget
+SQL_REPEAT_LIMIT = 10 # with SQL_AUDIT, statements run more often than this in one request are reported
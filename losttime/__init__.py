@@ -36,6 +36,11 @@ from flask_migrate import Migrate
 db = SQLAlchemy(app)
 migrate = Migrate(app, db)
 
+### Time requests and count their sql statements
+
+from . import timing
+from . import querycount
+
 ### Setup Authentication
 from flask_login import LoginManager, current_user
 from flask_bcrypt import Bcrypt
@@ -84,6 +89,13 @@ def datetimeformat(value, format='%Y-%m-%dT%H:%M:%S'):
     except:
         return ''
 
+@app.template_filter()
+def minutesSeconds(value):
+    if value is None:
+        return ''
+    minutes, seconds = divmod(int(value), 60)
+    return '{0:d}:{1:02d}'.format(minutes, seconds)
+
 @app.template_filter()
 def htmlEscapeQuotes(value):
     value = value.replace("'", "&#39;")
@@ -91,6 +103,8 @@ def htmlEscapeQuotes(value):
     return value
 
 ### Load the Blueprints / Paths
+# numpy, dominate, fuzzywuzzy and WeasyPrint are imported by the functions
+# that use them, so a new worker doesn't load them until it needs them.
 
 from .views.event_result import eventResult as eventResultBP
 app.register_blueprint(eventResultBP, url_prefix='/event-result')
@@ -0,0 +1,148 @@
+# losttime/jobs.py
+#
+# Runs slow work (scoring, page building) outside the request. Jobs are rows
+# in the Job table; a local process pool picks them up, no broker needed.
+# Set JOB_WORKERS = 0 in the config to run jobs inline in the request.
+# A job left queued or running by a restart or a dead worker is marked
+# failed once it is JOB_TIMEOUT_SECONDS old, so pages polling it stop.
+
+import json
+import traceback
+from datetime import datetime, timedelta
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from sqlalchemy import and_, or_
+from losttime import app, db
+from losttime.models import Job
+from losttime.timing import timed_job
+
+_handlers = {}
+_pool = None
+
+STALE_ERROR = 'Job stopped without finishing, no progress in {} seconds'
+
+
+def job_handler(kind):
+    """Register a function as the handler for jobs of this kind.
+
+    The handler is called as handler(targetid, **params) in an app context.
+    """
+    def register(f):
+        _handlers[kind] = f
+        return f
+    return register
+
+
+def enqueue_job(kind, targetid, **params):
+    """Save a new job and hand it to the worker pool. Returns the Job."""
+    job = Job(kind, targetid, json.dumps(params))
+    db.session.add(job)
+    db.session.commit()
+    if app.config.get('JOB_WORKERS', 2) == 0:
+        run_job(job.id)
+        db.session.expire(job)
+    else:
+        jobid = job.id
+        future = _get_pool().submit(_run_job_in_worker, jobid)
+        future.add_done_callback(lambda f: _check_worker(f, jobid))
+    return job
+
+
+def latest_job(kind, targetid):
+    """The newest job of this kind for the target, marked failed if stale"""
+    job = Job.query.filter_by(kind=kind, targetid=targetid).order_by(Job.id.desc()).first()
+    if job is not None and _is_stale(job):
+        _fail_job(job, STALE_ERROR.format(_timeout()))
+    return job
+
+
+def fail_stale_jobs():
+    """Mark failed the queued and running jobs older than the timeout"""
+    cutoff = datetime.now() - timedelta(seconds=_timeout())
+    stale = Job.query.filter(or_(and_(Job.status == 'queued', Job.created < cutoff),
+                                 and_(Job.status == 'running', Job.started < cutoff))).all()
+    for job in stale:
+        _fail_job(job, STALE_ERROR.format(_timeout()))
+    return len(stale)
+
+
+def run_job(jobid):
+    job = Job.query.get(jobid)
+    job.status = 'running'
+    job.started = datetime.now()
+    db.session.add(job)
+    db.session.commit()
+    try:
+        with timed_job(job.kind, job.targetid):
+            _handlers[job.kind](job.targetid, **json.loads(job.params))
+        job.status = 'done'
+    except Exception:
+        db.session.rollback()
+        app.logger.exception('Job {} ({}) failed'.format(job.id, job.kind))
+        job.status = 'failed'
+        job.error = traceback.format_exc()
+    job.finished = datetime.now()
+    db.session.add(job)
+    db.session.commit()
+    return job.status
+
+
+def _fail_job(job, error):
+    app.logger.warning('Job {} ({}) failed: {}'.format(job.id, job.kind, error))
+    job.status = 'failed'
+    job.error = error
+    job.finished = datetime.now()
+    db.session.add(job)
+    db.session.commit()
+    return
+
+
+def _timeout():
+    return app.config.get('JOB_TIMEOUT_SECONDS', 30 * 60)
+
+
+def _is_stale(job):
+    since = {'queued': job.created, 'running': job.started}.get(job.status)
+    return since is not None and since < datetime.now() - timedelta(seconds=_timeout())
+
+
+def _get_pool():
+    global _pool
+    if _pool is None:
+        # jobs a previous process left behind will never be picked up
+        fail_stale_jobs()
+        _pool = ProcessPoolExecutor(max_workers=app.config.get('JOB_WORKERS', 2),
+                                    initializer=_init_worker)
+    return _pool
+
+
+def _init_worker():
+    # forked workers must not reuse the parent's database connections
+    with app.app_context():
+        db.engine.dispose()
+
+
+def _check_worker(future, jobid):
+    # run_job catches the handler's errors, anything here means the worker
+    # never finished the job, e.g. it was killed and broke the pool
+    global _pool
+    error = 'cancelled' if future.cancelled() else future.exception()
+    if error is None:
+        return
+    if isinstance(error, BrokenProcessPool):
+        _pool = None
+    with app.app_context():
+        try:
+            job = Job.query.get(jobid)
+            if job is not None and job.status in ('queued', 'running'):
+                _fail_job(job, 'Worker stopped before the job finished: {!r}'.format(error))
+        finally:
+            db.session.remove()
+
+
+def _run_job_in_worker(jobid):
+    with app.app_context():
+        try:
+            return run_job(jobid)
+        finally:
+            db.session.remove()
@@ -40,6 +40,10 @@ class User(db.Model, UserMixin):
         return bcrypt.check_password_hash(self._password, self.salt+plaintext)
 
 class Event(db.Model):
+    __table_args__ = (
+        db.Index('ix_event_ltuserid_isProcessed_replacedbyid', 'ltuserid', 'isProcessed', 'replacedbyid'),
+        db.Index('ix_event_replacedbyid', 'replacedbyid'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     ltuserid = db.Column(db.Integer) # foreign key User.id
     name = db.Column(db.String)
@@ -64,6 +68,9 @@ class Event(db.Model):
         return
 
 class EventClass(db.Model):
+    __table_args__ = (
+        db.Index('ix_event_class_eventid', 'eventid'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     eventid = db.Column(db.Integer)
     name = db.Column(db.String)
@@ -78,6 +85,10 @@ class EventClass(db.Model):
         return
 
 class PersonResult(db.Model):
+    __table_args__ = (
+        db.Index('ix_person_result_eventid_classid', 'eventid', 'classid'),
+        db.Index('ix_person_result_classid', 'classid'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     eventid = db.Column(db.Integer)
     classid = db.Column(db.Integer)
@@ -118,43 +129,93 @@ class PersonResult(db.Model):
         minutes, seconds = divmod(self.time, 60)
         return '{0:d}:{1:02d}'.format(minutes, seconds)
 
+class ResultSplits(db.Model):
+    # split times of one PersonResult. The arrays are packed little-endian
+    # int32, one value per control then one for the finish, -1 for none.
+    # legranks, splitranks and timeloss are filled in when the event is
+    # processed, compared with the class's runners on the same controls.
+    __table_args__ = (
+        db.Index('ix_result_splits_eventid', 'eventid'),
+    )
+    resultid = db.Column(db.Integer, primary_key=True)
+    eventid = db.Column(db.Integer)
+    classid = db.Column(db.Integer)
+    controls = db.Column(db.String) # control codes in course order, comma separated
+    times = db.Column(db.LargeBinary) # seconds from the start at each control
+    legranks = db.Column(db.LargeBinary) # place on the leg into each control
+    splitranks = db.Column(db.LargeBinary) # place on time from the start
+    timeloss = db.Column(db.LargeBinary) # estimated seconds lost on each leg
+
+    def __init__(self, resultid, eventid, classid, controls, times):
+        self.resultid = resultid
+        self.eventid = eventid
+        self.classid = classid
+        self.controls = controls
+        self.times = times
+        return
+
 class EventTeamClass(db.Model):
+    __table_args__ = (
+        db.Index('ix_event_team_class_eventid', 'eventid'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     eventid = db.Column(db.Integer)
     shortname = db.Column(db.String)
     name = db.Column(db.String)
-    classids = db.Column(db.String)
     scoremethod = db.Column(db.String)
 
-    def __init__(self, event, shortname, name, classes, scoremethod=''):
+    def __init__(self, event, shortname, name, scoremethod=''):
         self.eventid = int(event)
         self.shortname = shortname
         self.name = name
-        self.classids = str(classes).strip('[]').replace(' ', '')
         self.scoremethod = scoremethod
         return
 
+class EventTeamClassMember(db.Model):
+    # EventClass ids whose results count toward an EventTeamClass
+    teamclassid = db.Column(db.Integer, primary_key=True)
+    classid = db.Column(db.Integer, primary_key=True)
+
+    def __init__(self, teamclass, eventclass):
+        self.teamclassid = teamclass
+        self.classid = eventclass
+        return
+
 class TeamResult(db.Model):
+    __table_args__ = (
+        db.Index('ix_team_result_teamclassid', 'teamclassid'),
+        db.Index('ix_team_result_eventid', 'eventid'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     eventid = db.Column(db.Integer)
     teamclassid = db.Column(db.Integer)
     teamname_short = db.Column(db.String)
     position = db.Column(db.Integer)
     score = db.Column(db.Float)
-    resultids = db.Column(db.String)
     numstarts = db.Column(db.Integer)
     numfinishes = db.Column(db.Integer)
 
-    def __init__(self, event, teamclass, teamname_short, members, score=None, starts=None, finishes=None):
+    def __init__(self, event, teamclass, teamname_short, score=None, starts=None, finishes=None):
         self.eventid = event
         self.teamclassid = teamclass
         self.teamname_short = teamname_short
-        self.resultids = str(members).strip('[]').replace(' ', '')
         self.score = score
         self.numstarts = starts
         self.numfinishes = finishes
         return
 
+class TeamResultMember(db.Model):
+    # PersonResult ids of the scoring members of a TeamResult
+    teamresultid = db.Column(db.Integer, primary_key=True)
+    resultid = db.Column(db.Integer, primary_key=True)
+    ordinal = db.Column(db.Integer) # order of individual scores, best first
+
+    def __init__(self, teamresult, result, ordinal):
+        self.teamresultid = teamresult
+        self.resultid = result
+        self.ordinal = ordinal
+        return
+
 class ClubCode(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     namespace = db.Column(db.String)
@@ -180,35 +241,113 @@ class Series(db.Model):
     name = db.Column(db.String)
     host = db.Column(db.String)
     updated = db.Column(db.DateTime)
-    eventids = db.Column(db.String)
     scoremethod = db.Column(db.String)
     scoreeventscount = db.Column(db.Integer)
     scoreeventsneeded = db.Column(db.Integer)
     scoretiebreak = db.Column(db.String)
     replacedbyid = db.Column(db.Integer) # None or latest rev event ID.
     isProcessed = db.Column(db.Boolean)
+    outputformat = db.Column(db.String) # format of the saved series page, None until it is written
 
-    def __init__(self, events, ltuser=None):
+    def __init__(self, ltuser=None):
         self.ltuserid = ltuser
-        self.eventids = str(events).strip('[]').replace(' ', '')
         self.replacedbyid = None
         self.isProcessed = False
         return
 
+class SeriesEvent(db.Model):
+    __table_args__ = (
+        db.Index('ix_series_event_eventid', 'eventid'),
+    )
+    seriesid = db.Column(db.Integer, primary_key=True)
+    eventid = db.Column(db.Integer, primary_key=True)
+    ordinal = db.Column(db.Integer) # event number within the series
+
+    def __init__(self, series, event, ordinal):
+        self.seriesid = series
+        self.eventid = event
+        self.ordinal = ordinal
+        return
+
 class SeriesClass(db.Model):
+    __table_args__ = (
+        db.Index('ix_series_class_seriesid', 'seriesid'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     seriesid = db.Column(db.Integer)
     name = db.Column(db.String)
     shortname = db.Column(db.String)
-    eventids = db.Column(db.String)
-    eventclassids = db.Column(db.String)
     classtype = db.Column(db.String)
 
-    def __init__(self, seriesid, name, shortname, eventids, classids, classtype):
+    def __init__(self, seriesid, name, shortname, classtype):
         self.seriesid = seriesid
         self.name = name
         self.shortname = shortname
-        self.eventids = eventids
-        self.eventclassids = str(classids).strip('[]').replace(' ', '')
         self.classtype = classtype
         return
+
+class SeriesClassMember(db.Model):
+    # EventClass ids (classtype 'indv') or EventTeamClass ids (classtype 'team')
+    # combined into a SeriesClass
+    seriesclassid = db.Column(db.Integer, primary_key=True)
+    classid = db.Column(db.Integer, primary_key=True)
+
+    def __init__(self, seriesclass, eventclass):
+        self.seriesclassid = seriesclass
+        self.classid = eventclass
+        return
+
+class SeriesStanding(db.Model):
+    # series totals of one competitor in a series class, kept up to date when
+    # a series is saved or one of its events is replaced
+    __table_args__ = (
+        db.Index('ix_series_standing_seriesclassid', 'seriesclassid'),
+    )
+    seriesid = db.Column(db.Integer, primary_key=True)
+    seriesclassid = db.Column(db.Integer, primary_key=True)
+    competitor = db.Column(db.String, primary_key=True) # name and club for individuals, team name for teams
+    name = db.Column(db.String)
+    club = db.Column(db.String)
+    score = db.Column(db.Float) # None if too few events were scored
+    tiebreak = db.Column(db.String) # json list of tiebreak scores
+    position = db.Column(db.Integer)
+    results = db.Column(db.String) # json {eventid: [score, position]} of the competitor's series event results
+
+    def __init__(self, seriesid, seriesclassid, competitor, name, club=None):
+        self.seriesid = seriesid
+        self.seriesclassid = seriesclassid
+        self.competitor = competitor
+        self.name = name
+        self.club = club
+        return
+
+class Job(db.Model):
+    __table_args__ = (
+        db.Index('ix_job_kind_targetid', 'kind', 'targetid'),
+    )
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String) # name of a handler registered in losttime.jobs
+    targetid = db.Column(db.Integer) # Event.id or Series.id the job works on
+    params = db.Column(db.String) # json encoded keyword args for the handler
+    status = db.Column(db.String) # queued, running, done, failed
+    error = db.Column(db.String)
+    created = db.Column(db.DateTime)
+    started = db.Column(db.DateTime)
+    finished = db.Column(db.DateTime)
+
+    def __init__(self, kind, targetid, params):
+        self.kind = kind
+        self.targetid = targetid
+        self.params = params
+        self.status = 'queued'
+        self.created = datetime.now()
+        return
+
+    def serialize(self):
+        return {
+            'id': self.id,
+            'kind': self.kind,
+            'targetid': self.targetid,
+            'status': self.status,
+            'error': self.error
+        }
@@ -0,0 +1,125 @@
+# losttime/pdfs.py
+#
+# Renders check-in sheet pdfs outside the request. Each process in a small
+# pool imports WeasyPrint and parses the stylesheet when it starts, so a sheet
+# only pays for its own layout. The html waiting to be rendered sits next to
+# the pdf it becomes and pdf_status reads the files, so any web worker can
+# answer for a render another one started. The html's modified time is when
+# the render was requested, a render not done PDF_TIMEOUT_SECONDS later, or
+# whose worker died, is reported failed so the download page stops polling.
+# Set PDF_WORKERS = 0 in the config to render pdfs inline in the request.
+
+import os
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from losttime import app
+
+_pool = None
+_stylesheets = {} # path: parsed weasyprint.CSS, kept for the life of the process
+
+
+def render_pdf(htmlfile, pdffile, stylesheet):
+    """Hand htmlfile to the pool to be written as pdffile.
+
+    htmlfile is removed once it is rendered. If rendering fails the
+    traceback is saved as pdffile + '.error' instead of the pdf.
+    """
+    if app.config.get('PDF_WORKERS', 1) == 0:
+        _render(htmlfile, pdffile, stylesheet)
+    else:
+        future = _get_pool(stylesheet).submit(_render, htmlfile, pdffile, stylesheet)
+        future.add_done_callback(lambda f: _check_worker(f, htmlfile, pdffile))
+
+
+def pdf_status(htmlfile, pdffile):
+    """'done', 'failed' or 'running', None if no such pdf was requested"""
+    if os.path.isfile(pdffile):
+        return 'done'
+    if os.path.isfile(pdffile + '.error'):
+        return 'failed'
+    try:
+        requested = os.path.getmtime(htmlfile)
+    except OSError:
+        return None
+    if time.time() - requested > app.config.get('PDF_TIMEOUT_SECONDS', 5 * 60):
+        _fail(htmlfile, pdffile, 'No pdf {0:.0f} seconds after it was requested'.format(time.time() - requested))
+        return 'failed'
+    return 'running'
+
+
+def warm_pool(stylesheet):
+    """Start the workers now so the first sheet does not wait for them"""
+    workers = app.config.get('PDF_WORKERS', 1)
+    if workers > 0 and _pool is None:
+        pool = _get_pool(stylesheet)
+        for i in range(workers):
+            pool.submit(_ready)
+
+
+def _get_pool(stylesheet):
+    global _pool
+    if _pool is None:
+        _pool = ProcessPoolExecutor(max_workers=app.config.get('PDF_WORKERS', 1),
+                                    initializer=_init_worker, initargs=(stylesheet,))
+    return _pool
+
+
+def _init_worker(stylesheet):
+    # a stylesheet that fails to load here is reported by the first render
+    try:
+        _stylesheet(stylesheet)
+    except Exception:
+        app.logger.exception('Could not preload {}'.format(stylesheet))
+
+
+def _check_worker(future, htmlfile, pdffile):
+    # _render saves its own errors, anything here means the worker never
+    # finished, e.g. it was killed and broke the pool
+    global _pool
+    error = 'cancelled' if future.cancelled() else future.exception()
+    if error is None:
+        return
+    if isinstance(error, BrokenProcessPool):
+        _pool = None
+    if not os.path.isfile(pdffile):
+        _fail(htmlfile, pdffile, 'Worker stopped before the pdf was rendered: {!r}'.format(error))
+
+
+def _fail(htmlfile, pdffile, error):
+    app.logger.warning('Rendering {} failed: {}'.format(pdffile, error))
+    with open(pdffile + '.error', 'w') as f:
+        f.write(error)
+    if os.path.isfile(htmlfile):
+        os.remove(htmlfile)
+    return
+
+
+def _ready():
+    return True
+
+
+def _stylesheet(path):
+    if path not in _stylesheets:
+        from weasyprint import CSS
+        _stylesheets[path] = CSS(filename=path)
+    return _stylesheets[path]
+
+
+def _render(htmlfile, pdffile, stylesheet):
+    try:
+        from weasyprint import HTML
+        with open(htmlfile, 'r') as f:
+            doc = f.read()
+        # readers only ever see a finished pdf
+        partfile = pdffile + '.part'
+        HTML(string=doc).write_pdf(partfile, stylesheets=[_stylesheet(stylesheet)])
+        os.replace(partfile, pdffile)
+    except Exception:
+        app.logger.exception('Rendering {} failed'.format(pdffile))
+        with open(pdffile + '.error', 'w') as f:
+            f.write(traceback.format_exc())
+    finally:
+        if os.path.isfile(htmlfile):
+            os.remove(htmlfile)
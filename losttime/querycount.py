@@ -0,0 +1,135 @@
+# losttime/querycount.py
+#
+# Development aid for views that query in a loop. With SQL_AUDIT = True in
+# the config every request groups its sql statements by their normalized
+# text and logs a warning for each one run more than SQL_REPEAT_LIMIT times,
+# the usual sign of one query per row. Views can declare how many statements
+# they may run with @query_budget(n). Going over the budget is a warning, or a
+# QueryBudgetExceeded error when TESTING is set so the test fails.
+# count_queries() counts the statements run by any block of code. This is the
+# only sql listener, losttime.timing reads statements_run() for its stages.
+
+import re
+import threading
+from collections import Counter
+from contextlib import contextmanager
+from functools import wraps
+from flask import request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from losttime import app
+
+_local = threading.local() # QueryCounters collecting on this thread, and its statement count
+
+_literals = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+_inlists = re.compile(r'\((?:\s*\?\s*,)+\s*\?\s*\)')
+_spaces = re.compile(r'\s+')
+
+
+class QueryBudgetExceeded(Exception):
+    pass
+
+
+class QueryCounter(object):
+    """Sql statements run while counting, grouped by normalized text"""
+    def __init__(self):
+        self.total = 0
+        self.statements = Counter()
+        return
+
+    def add(self, statement):
+        self.total += 1
+        self.statements[normalize(statement)] += 1
+        return
+
+    def repeated(self, limit):
+        """[(statement, count)] for statements run more than limit times"""
+        return [(s, n) for s, n in self.statements.most_common() if n > limit]
+
+    def report(self, limit=0):
+        lines = ['{0} statements, {1} distinct'.format(self.total, len(self.statements))]
+        lines += ['{0:5d}x {1}'.format(n, s) for s, n in self.repeated(limit)]
+        return '\n'.join(lines)
+
+
+def normalize(statement):
+    """Statement text with literals and IN lists replaced, to group repeats"""
+    statement = _literals.sub('?', statement)
+    statement = _inlists.sub('(?...)', statement)
+    return _spaces.sub(' ', statement).strip()
+
+
+@contextmanager
+def count_queries():
+    """Count the sql statements run on this thread inside the block
+
+        with count_queries() as counted:
+            ...
+        assert counted.total <= 5, counted.report()
+    """
+    counter = QueryCounter()
+    counters = _counters()
+    counters.append(counter)
+    try:
+        yield counter
+    finally:
+        counters.remove(counter)
+
+
+def statements_run():
+    """Sql statements run on this thread so far, take the difference to count a block"""
+    return getattr(_local, 'run', 0)
+
+
+def query_budget(limit):
+    """Declare the most sql statements a view should run"""
+    def decorate(f):
+        @wraps(f)
+        def wrapped(*args, **kwargs):
+            if not (app.config.get('SQL_AUDIT') or app.testing):
+                return f(*args, **kwargs)
+            with count_queries() as counted:
+                response = f(*args, **kwargs)
+            if counted.total > limit:
+                message = '{0} ran {1} sql statements, its budget is {2}\n{3}'.format(
+                    request.endpoint, counted.total, limit, counted.report(1))
+                if app.testing:
+                    raise QueryBudgetExceeded(message)
+                app.logger.warning(message)
+            return response
+        return wrapped
+    return decorate
+
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _count_query(conn, cursor, statement, parameters, context, executemany):
+    _local.run = statements_run() + 1
+    for counter in getattr(_local, 'counters', ()):
+        counter.add(statement)
+
+
+@app.before_request
+def _start_audit():
+    _local.audit = None
+    if app.config.get('SQL_AUDIT'):
+        _local.audit = QueryCounter()
+        _counters().append(_local.audit)
+
+
+@app.teardown_request
+def _finish_audit(exc):
+    audit = getattr(_local, 'audit', None)
+    if audit is None:
+        return
+    _local.audit = None
+    _counters().remove(audit)
+    limit = app.config.get('SQL_REPEAT_LIMIT', 10)
+    if audit.repeated(limit):
+        app.logger.warning('{0} {1} repeated sql statements: {2}'.format(
+            request.method, request.path, audit.report(limit)))
+
+
+def _counters():
+    if not hasattr(_local, 'counters'):
+        _local.counters = []
+    return _local.counters
@@ -0,0 +1,113 @@
+# losttime/timing.py
+#
+# Shows where a slow request or job spends its time. Wrap each step in
+# `with stage('name'):` to record how long it took and how many sql
+# statements it ran. A request sends its stages back in a Server-Timing
+# header, which the browser's network tab shows. Requests and jobs also log
+# one json line. The line is a warning when they take longer than
+# SLOW_REQUEST_SECONDS, otherwise it is logged at info level.
+
+import json
+import threading
+from time import perf_counter
+from contextlib import contextmanager
+from flask import request
+from losttime import app
+from losttime.querycount import statements_run
+
+_local = threading.local() # the timings being collected on this thread, if any
+
+
+@contextmanager
+def stage(name):
+    """Time a block as one stage of the current request or job
+
+    Does nothing outside a request or job. Stages can nest, each one reports
+    its own total including the stages inside it.
+    """
+    timings = getattr(_local, 'timings', None)
+    if timings is None:
+        yield
+        return
+    # listed in the order they start, so outer stages come first
+    index = len(timings['stages'])
+    timings['stages'].append((name, 0.0, 0))
+    queries = statements_run()
+    started = perf_counter()
+    try:
+        yield
+    finally:
+        timings['stages'][index] = (name, perf_counter() - started, statements_run() - queries)
+
+
+@contextmanager
+def timed_job(kind, targetid):
+    """Collect and log the stages of a job
+
+    A job run inline in a request becomes one stage of that request.
+    """
+    if getattr(_local, 'timings', None) is not None:
+        with stage('job'):
+            yield
+        return
+    _start()
+    try:
+        yield
+    finally:
+        _log('job', '{0} {1}'.format(kind, targetid), _finish())
+
+
+def server_timing(timings):
+    """Server-Timing header value for finished timings"""
+    metrics = ['{0};dur={1:.1f};desc="{2} queries"'.format(name, seconds * 1000, queries)
+               for name, seconds, queries in timings['stages']]
+    metrics.append('total;dur={0:.1f};desc="{1} queries"'.format(timings['total'] * 1000, timings['queries']))
+    return ', '.join(metrics)
+
+
+@app.before_request
+def _start_request():
+    _start()
+
+
+@app.after_request
+def _finish_request(response):
+    if getattr(_local, 'timings', None) is None:
+        return response
+    timings = _finish()
+    response.headers['Server-Timing'] = server_timing(timings)
+    _log('request', '{0} {1} {2}'.format(request.method, request.path, response.status_code), timings)
+    return response
+
+
+@app.teardown_request
+def _drop_timings(exc):
+    # after_request is skipped when the view raised
+    _local.timings = None
+
+
+def _start():
+    _local.timings = {'started': perf_counter(), 'firstquery': statements_run(), 'stages': []}
+
+
+def _finish():
+    timings = _local.timings
+    _local.timings = None
+    timings['total'] = perf_counter() - timings.pop('started')
+    timings['queries'] = statements_run() - timings.pop('firstquery')
+    return timings
+
+
+def _log(kind, what, timings):
+    line = json.dumps({
+        'timing': kind,
+        'what': what,
+        'ms': round(timings['total'] * 1000, 1),
+        'queries': timings['queries'],
+        'stages': [{'stage': name, 'ms': round(seconds * 1000, 1), 'queries': queries}
+                   for name, seconds, queries in timings['stages']],
+    })
+    if timings['total'] > app.config.get('SLOW_REQUEST_SECONDS', 5):
+        app.logger.warning(line)
+    else:
+        app.logger.info(line)
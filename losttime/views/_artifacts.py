@@ -0,0 +1,115 @@
+# losttime/views/_artifacts.py
+#
+# Result pages are written once and read many times, mostly on race night.
+# writeArtifact saves gzip and brotli copies next to each page so they are
+# never compressed per request, and sendArtifact picks the copy the client
+# accepts and answers 304 when the client already has it.
+
+import gzip
+import hashlib
+import os
+import tempfile
+from flask import request, send_file, make_response, session
+from losttime import app
+
+try:
+    import brotli
+except ImportError: # no .br copies, gzip and plain pages still work
+    brotli = None
+
+ENCODINGS = [('br', '.br'), ('gzip', '.gz')] # most preferred first
+
+_etags = {} # path: (mtime, size, etag) so each page is hashed once per change
+
+
+def writeArtifact(path, text):
+    """Write a result page and its compressed copies"""
+    data = text.encode('utf-8')
+    if brotli is not None:
+        _replace(path + '.br', brotli.compress(data, mode=brotli.MODE_TEXT,
+                                               quality=app.config.get('BROTLI_QUALITY', 9)))
+    elif os.path.isfile(path + '.br'):
+        os.remove(path + '.br')
+    _replace(path + '.gz', gzip.compress(data, 9))
+    # the page itself goes last, its ETag covers the copies
+    _replace(path, data)
+
+
+def artifactETag(path):
+    """Strong ETag for the page at path, None if there is no such page"""
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    cached = _etags.get(path)
+    if cached is None or cached[:2] != (stat.st_mtime, stat.st_size):
+        with open(path, 'rb') as f:
+            cached = (stat.st_mtime, stat.st_size, hashlib.sha1(f.read()).hexdigest())
+        _etags[path] = cached
+    return cached[2]
+
+
+def sendArtifact(path):
+    """Response with the result page at path, or its compressed copy
+
+    Sends 404 if the page doesn't exist, 304 if If-None-Match holds its ETag.
+    """
+    etag = artifactETag(path)
+    if etag is None:
+        return "Hmm... we didn't find that file", 404
+    encoding = None
+    for name, suffix in ENCODINGS:
+        if request.accept_encodings[name] and os.path.isfile(path + suffix):
+            encoding = name
+            path += suffix
+            etag = '{0}-{1}'.format(etag, name)
+            break
+    if request.if_none_match.contains(etag):
+        response = make_response('', 304)
+    else:
+        response = send_file(path, mimetype='text/html', conditional=False, add_etags=False)
+        if encoding:
+            response.headers['Content-Encoding'] = encoding
+    response.set_etag(etag)
+    response.vary.add('Accept-Encoding')
+    response.cache_control.no_cache = True
+    return response
+
+
+def renderTagged(etag, render):
+    """Response for a page built from result files, render() only if needed
+
+    etag should change whenever the page would. Pages with flashed messages
+    waiting are always rendered and not tagged, so the messages get shown.
+    Neither are errors render() returns, like a 404.
+    """
+    if '_flashes' in session:
+        return make_response(render())
+    if request.if_none_match.contains(etag):
+        response = make_response('', 304)
+    else:
+        response = make_response(render())
+        if response.status_code != 200:
+            return response
+    response.set_etag(etag)
+    response.cache_control.no_cache = True
+    return response
+
+
+def pageETag(*parts):
+    """Strong ETag from everything a page depends on"""
+    return hashlib.sha1(repr(parts).encode('utf-8')).hexdigest()
+
+
+def _replace(path, data):
+    # readers see the old file or the new one, never half of one. Each writer
+    # gets its own temp file so two writing the same page don't collide.
+    fd, partial = tempfile.mkstemp(dir=os.path.dirname(path), prefix=os.path.basename(path), suffix='.part')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.chmod(partial, 0o644) # mkstemp makes it private, pages are served as static files
+        os.replace(partial, path)
+    finally:
+        if os.path.exists(partial):
+            os.remove(partial)
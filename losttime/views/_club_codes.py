@@ -0,0 +1,49 @@
+# losttime/views/_club_codes.py
+#
+# Club codes change a few times a season but every result page looks them up.
+# Each process keeps one copy of the table. Changing the table must be
+# followed by invalidateClubCodes, which replaces a stamp file every process
+# checks before using its copy, so the job pool workers that build the pages
+# see the change too.
+
+import os
+from losttime import app
+from losttime.models import ClubCode
+
+_cache = {'stamp': None, 'codes': None}
+
+
+def getClubCodes():
+    """{code: [ClubCode]} for every club, read only, shared by the writers"""
+    stamp = _stamp()
+    if _cache['codes'] is None or _cache['stamp'] != stamp:
+        codes = {}
+        for club in ClubCode.query.all():
+            # copies outside the session never expire or detach
+            codes.setdefault(club.code, []).append(ClubCode(club.namespace, club.code, club.name))
+        _cache['codes'] = codes
+        _cache['stamp'] = stamp
+    return _cache['codes']
+
+
+def invalidateClubCodes():
+    """Make every process read the club codes again, call after committing"""
+    _cache['codes'] = None
+    os.makedirs(app.instance_path, exist_ok=True)
+    path = _stampFile()
+    with open(path + '.part', 'w') as f:
+        f.write(str(os.getpid()))
+    os.replace(path + '.part', path)
+
+
+def _stampFile():
+    return os.path.join(app.instance_path, 'clubcodes.stamp')
+
+
+def _stamp():
+    try:
+        stat = os.stat(_stampFile())
+    except OSError:
+        return None
+    # replacing the file always gives a new inode
+    return (stat.st_ino, stat.st_mtime_ns)
@@ -0,0 +1,83 @@
+# losttime/views/_html_stream.py
+#
+# Writes html text straight into a list of chunks instead of building a
+# dominate tree first. Indentation, attribute order and escaping follow
+# dominate's pretty renderer, so a page written with HtmlStream is byte for
+# byte the page dominate would render for the same tags.
+
+import numbers
+
+SINGLE_TAGS = ['base', 'link', 'meta', 'hr', 'br', 'wbr', 'img', 'embed', 'param',
+               'source', 'track', 'area', 'col', 'input', 'keygen', 'command']
+ATTRIBUTE_NAMES = {'cls': 'class', 'className': 'class', 'class_name': 'class',
+                   'fr': 'for', 'html_for': 'for', 'htmlFor': 'for'}
+
+
+class HtmlStream(object):
+    """
+    Chunked html builder. Tags opened with tag() are closed when the with
+    block exits, tags written with leaf() hold only text:
+
+        s = HtmlStream()
+        with s.tag('tr', id='column-titles'):
+            s.leaf('th', 'Name')
+        s.render()
+    """
+    def __init__(self, doctype=None, indent='  '):
+        self.chunks = [doctype, '\n'] if doctype else []
+        self.indent = indent
+        self.stack = [] # [name, has tag children] for each open tag
+
+    def tag(self, tagname, *content, **attrs):
+        """Open a tag, close it with the returned context manager"""
+        self.__start(tagname, attrs)
+        if tagname not in SINGLE_TAGS:
+            self.stack.append([tagname, False])
+            for c in content:
+                self.chunks.append(_text(c))
+        return self
+
+    def leaf(self, tagname, *content, **attrs):
+        """Write a complete tag holding only text content"""
+        self.__start(tagname, attrs)
+        if tagname not in SINGLE_TAGS:
+            self.chunks.extend([_text(c) for c in content])
+            self.chunks.append('</{0}>'.format(tagname))
+
+    def close(self):
+        tagname, nested = self.stack.pop()
+        if nested:
+            self.chunks.append('\n' + self.indent * len(self.stack))
+        self.chunks.append('</{0}>'.format(tagname))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def render(self):
+        return ''.join(self.chunks)
+
+    def __start(self, tagname, attrs):
+        if self.stack:
+            self.stack[-1][1] = True
+            self.chunks.append('\n' + self.indent * len(self.stack))
+        self.chunks.append('<' + tagname + _attributes(attrs) + '>')
+
+
+def _attributes(attrs):
+    if not attrs:
+        return ''
+    pairs = sorted((ATTRIBUTE_NAMES.get(k, k), v) for k, v in attrs.items() if v is not False)
+    return ''.join(' {0}="{1}"'.format(k, escape(str(v))) for k, v in pairs)
+
+def _text(obj):
+    if isinstance(obj, numbers.Number):
+        obj = str(obj)
+    if isinstance(obj, str):
+        return escape(obj)
+    raise ValueError('%r not a tag or string.' % obj)
+
+def escape(data):
+    return data.replace('&', '&amp;').replace('<', '&lt;').replace('>', '&gt;').replace('"', '&quot;')
@@ -13,7 +13,7 @@
 
 import csv, unicodedata
 from math import floor
-from defusedxml.ElementTree import parse
+from defusedxml.ElementTree import parse, iterparse
 from datetime import datetime
 
 class Event(object):
@@ -39,7 +39,7 @@ class EventClass(object):
 
 
 class EventPersonResult(object):
-    def __init__(self, name, bib, si, clubshort, coursestatus, resultstatus, time, score_points=None, score_penalty=None):
+    def __init__(self, name, bib, si, clubshort, coursestatus, resultstatus, time, score_points=None, score_penalty=None, splits=None):
         self.name = name
         self.bib = bib
         self.sicard = si
@@ -52,6 +52,7 @@ class EventPersonResult(object):
 
         self.ScoreO_points = score_points
         self.ScoreO_penalty = score_penalty
+        self.splits = splits # [(control code, seconds from start or None)] in course order
 
         self.event = None
         self.eventclass = None
@@ -61,9 +62,16 @@ class EventPersonResult(object):
         return 'EventPersonResult {0} ({1})'.format(self.name, self.clubshortname)
 
 class OrienteerResultReader(object):
-    def __init__(self, file, ScoreO=False):
+    def __init__(self, file, ScoreO=False, stream=False):
+        '''
+        stream=True reads xml files with a single incremental iterparse pass
+        instead of holding the whole ElementTree in memory. Use
+        iterEventClassPersonResults() to get the results in that mode, the
+        class by class getters keep every class from one pass.
+        '''
         self.file = file
         self.ScoreO = ScoreO
+        self.stream = stream
         self.filetype = file.rsplit('.', 1)[1].lower()
         if self.filetype == 'xml':
             self.isValid = self._validateXML()
@@ -76,6 +84,8 @@ class OrienteerResultReader(object):
     def _validateXML(self):
         self.xmlns = {'iof3': 'http://www.orienteering.org/datastandard/3.0', 
               'xsi': 'http://www.w3.org/2001/XMLSchema-instance'}
+        if self.stream:
+            return self._validateXMLStream()
         with open(self.file, 'r', encoding="utf-8") as xmlfile:
             xmlfile.readline().replace('windows-1252', 'utf-8')
             self.xmltree = parse(xmlfile)
@@ -89,7 +99,26 @@ class OrienteerResultReader(object):
             return False
         return True
 
+    def _validateXMLStream(self):
+        self.xmltree = None
+        self.streamindex = None
+        with open(self.file, 'r', encoding="utf-8") as xmlfile:
+            xmlfile.readline()
+            for action, elem in iterparse(xmlfile, events=('start',)):
+                self.xmlroot = elem
+                break
+            else:
+                return False
+            if self.xmlroot.tag != self._iof3('ResultList'):
+                return False
+
+        self.xmlv = floor(float(self.xmlroot.attrib['iofVersion']))
+        if self.xmlv not in [3]:
+            return False
+        return True
+
     def _validateCSV(self):
+        self.csvindex = None
         with open(self.file, 'r') as csvfile:
             reader = csv.reader(csvfile, delimiter=',')
             firstline = next(reader)
@@ -187,7 +216,9 @@ class OrienteerResultReader(object):
 
     def getEventMeta(self):
         #return Event object
-        if self.filetype == 'xml':
+        if self.filetype == 'xml' and self.stream:
+            return self._getEventXMLStream()
+        elif self.filetype == 'xml':
             return self._getEventXML()
         elif self.filetype == 'csv':
             return self._getEventCSV()
@@ -195,7 +226,9 @@ class OrienteerResultReader(object):
 
     def getEventClasses(self):
         #return list of EventClass objects
-        if self.filetype == 'xml':
+        if self.filetype == 'xml' and self.stream:
+            return list(self._getXMLStreamIndex()[0])
+        elif self.filetype == 'xml':
             return self._getEventClassesXML()
         elif self.filetype == 'csv':
             return self._getEventClassesCSV()
@@ -203,12 +236,23 @@ class OrienteerResultReader(object):
 
     def getEventClassPersonResults(self, eventClass):
         #return list of EPR objects
-        if self.filetype == 'xml':
+        if self.filetype == 'xml' and self.stream:
+            return list(self._getXMLStreamIndex()[1].get(eventClass.name, []))
+        elif self.filetype == 'xml':
             return self._getEventClassPersonResultsXML(eventClass)
         elif self.filetype == 'csv':
             return self._getEventClassPersonResultsCSV(eventClass)
         return None
 
+    def iterEventClassPersonResults(self):
+        #yield (EventClass, list of EPR objects) for each class
+        if self.filetype == 'xml' and self.stream:
+            for ec, results in self._iterEventClassPersonResultsXMLStream():
+                yield ec, results
+            return
+        for ec in self.getEventClasses():
+            yield ec, self.getEventClassPersonResults(ec)
+
 
 ##########
 # XML Helper Functions
@@ -238,17 +282,107 @@ class OrienteerResultReader(object):
         xpath += "../iof3:PersonResult"
         personresults = self.xmltree.findall(xpath, self.xmlns)
         for prElement in personresults:
-            pr = EventPersonResult(
-                self.__XMLgetPersonResultName(prElement),
-                self.__XMLgetPersonResultBib(prElement),
-                self.__XMLgetPersonResultSicard(prElement),
-                self.__XMLgetPersonResultClubShort(prElement),
-                self.__XMLgetPersonResultCourseStatus(prElement),
-                self.__XMLgetPersonResultResultStatus(prElement),
-                self.__XMLgetPersonResultTime(prElement),
-            )
-            results.append(pr)
+            results.append(self.__XMLbuildPersonResult(prElement))
         return results
+    def __XMLbuildPersonResult(self, prElement):
+        return EventPersonResult(
+            self.__XMLgetPersonResultName(prElement),
+            self.__XMLgetPersonResultBib(prElement),
+            self.__XMLgetPersonResultSicard(prElement),
+            self.__XMLgetPersonResultClubShort(prElement),
+            self.__XMLgetPersonResultCourseStatus(prElement),
+            self.__XMLgetPersonResultResultStatus(prElement),
+            self.__XMLgetPersonResultTime(prElement),
+            splits=self.__XMLgetPersonResultSplits(prElement),
+        )
+
+
+##########
+# XML Streaming Functions
+##########
+    def _iof3(self, tag):
+        return '{' + self.xmlns['iof3'] + '}' + tag
+
+    def _iterXMLStream(self):
+        '''
+        Single iterparse pass over the file. Yields each finished element
+        along with the stack of its (still open) ancestors.
+        '''
+        with open(self.file, 'r', encoding="utf-8") as xmlfile:
+            xmlfile.readline()
+            ancestors = []
+            for action, elem in iterparse(xmlfile, events=('start', 'end')):
+                if action == 'start':
+                    ancestors.append(elem)
+                    continue
+                ancestors.pop()
+                yield elem, ancestors
+
+    def _getEventXMLStream(self):
+        '''
+        Event meta is at the top of a ResultList, stop reading once it's found.
+        '''
+        name = None
+        date = None
+        hasEventDate = False
+        for elem, ancestors in self._iterXMLStream():
+            parent = ancestors[-1].tag if ancestors else None
+            if parent == self._iof3('Event'):
+                if elem.tag == self._iof3('Name'):
+                    name = elem.text
+                elif elem.tag == self._iof3('StartTime'):
+                    date = elem.text
+                    hasEventDate = True
+            elif elem.tag == self._iof3('Event') and hasEventDate:
+                break
+            elif elem.tag == self._iof3('StartTime') and parent == self._iof3('Result'):
+                date = elem.text #just grab the first one.
+                break
+        if date != None:
+            date = datetime.strptime(date.split('T')[0], '%Y-%m-%d')
+        return Event(name, date, self.__XMLgetEventVenue())
+
+    def _iterEventClassPersonResultsXMLStream(self):
+        '''
+        Yield (EventClass, [EventPersonResult]) as each ClassResult closes.
+        Finished elements are detached from the tree so memory stays flat.
+        '''
+        eventname = None
+        results = []
+        for elem, ancestors in self._iterXMLStream():
+            parent = ancestors[-1] if ancestors else None
+            if parent is None:
+                continue
+            if elem.tag == self._iof3('PersonResult') and parent.tag == self._iof3('ClassResult'):
+                results.append(self.__XMLbuildPersonResult(elem))
+                parent.remove(elem)
+            elif elem.tag == self._iof3('ClassResult'):
+                eventclass = EventClass(
+                    eventname,
+                    self.__XMLgetEventClassName(elem),
+                    self.__XMLgetEventClassShortName(elem),
+                    )
+                parent.remove(elem)
+                yield eventclass, results
+                results = []
+            elif elem.tag == self._iof3('Name') and parent.tag == self._iof3('Event'):
+                eventname = elem.text
+
+    def _getXMLStreamIndex(self):
+        '''
+        Keep the classes and results of one streaming pass for callers that
+        go class by class. Built on first use and kept for the life of the
+        reader.
+        '''
+        if self.streamindex is not None:
+            return self.streamindex
+        eventClasses = []
+        classResults = {}
+        for eventclass, results in self._iterEventClassPersonResultsXMLStream():
+            eventClasses.append(eventclass)
+            classResults.setdefault(eventclass.name, results) # first class with the name, as before
+        self.streamindex = (eventClasses, classResults)
+        return self.streamindex
 
 
 ##########
@@ -377,6 +511,33 @@ class OrienteerResultReader(object):
         else: raise ValueError
         return time
 
+    def __XMLgetPersonResultSplits(self, prtree):
+        '''
+        Additional punches are not part of the course and are left out,
+        missing ones are kept with a time of None.
+        '''
+        if self.xmlv == 3:
+            splits = []
+            # plain child loops, there can be dozens of splits per result
+            splittag, codetag, timetag = self._iof3('SplitTime'), self._iof3('ControlCode'), self._iof3('Time')
+            for result in prtree.iterfind('iof3:Result', self.xmlns):
+                for st in result:
+                    if st.tag != splittag or st.get('status') == 'Additional':
+                        continue
+                    code = None
+                    time = None
+                    for child in st:
+                        if child.tag == codetag:
+                            code = child.text
+                        elif child.tag == timetag:
+                            try:
+                                time = int(float(child.text))
+                            except (TypeError, ValueError):
+                                time = None
+                    splits.append((code, time))
+        else: raise ValueError
+        return splits
+
 ##########
 # CSV Helper Functions
 ##########
@@ -387,56 +548,55 @@ class OrienteerResultReader(object):
             None,
         )
     def _getEventClassesCSV(self):
+        return list(self._getCSVindex()[0])
+    def _getEventClassPersonResultsCSV(self, Oecr):
+        return list(self._getCSVindex()[1].get(Oecr.shortname, []))
+    def _getCSVindex(self):
+        '''
+        Read the csv once, grouping results by class shortname. Built on first
+        use and kept for the life of the reader.
+        '''
+        if self.csvindex is not None:
+            return self.csvindex
         eventClasses = []
-        known_codes = []
+        classResults = {}
         with open(self.file, 'r') as csvfile:
             reader = csv.reader(csvfile, delimiter=',')
             next(reader) # skip header line
             for line in reader:
                 class_short = self.__CSVgetEventClassShortName(line)
-                class_full = self.__CSVgetEventClassName(line)
-                if class_short in known_codes:
-                    continue
-                eventclass = EventClass(
-                    None,
-                    class_full,
-                    class_short,
-                    )
-                eventClasses.append(eventclass)
-                known_codes.append(class_short)
-        return eventClasses
-    def _getEventClassPersonResultsCSV(self, Oecr):
-        results = []
-        # May need to do something to get back to first line?
-        # Is there a better way than looping the entire file every time?
-        with open(self.file, 'r') as csvfile:
-            reader = csv.reader(csvfile, delimiter=',')
-            next(reader) # skip header line
-            for line in reader:
-                if self.__CSVgetEventClassShortName(line) != Oecr.shortname:
-                    continue
-                name = self.__CSVgetPersonResultName(line)
-                club = self.__CSVgetPersonResultClubShort(line)
-                time, coursestatus, resultstatus = self.__CSVgetPersonResultTime(line)
-                if self.ScoreO:
-                    score_points = self.__CSVgetPersonResultScorePoints(line)
-                    score_penalty = self.__CSVgetPersonResultScorePenalty(line)
-                else:
-                    score_points = None
-                    score_penalty = None
-                pr = EventPersonResult(
-                    name,
-                    None, # Bib
-                    None, # SiCard
-                    club,
-                    coursestatus,
-                    resultstatus,
-                    time,
-                    score_points,
-                    score_penalty
-                )
-                results.append(pr)
-        return results
+                if class_short not in classResults:
+                    eventclass = EventClass(
+                        None,
+                        self.__CSVgetEventClassName(line),
+                        class_short,
+                        )
+                    eventClasses.append(eventclass)
+                    classResults[class_short] = []
+                classResults[class_short].append(self.__CSVbuildPersonResult(line))
+        self.csvindex = (eventClasses, classResults)
+        return self.csvindex
+    def __CSVbuildPersonResult(self, line):
+        name = self.__CSVgetPersonResultName(line)
+        club = self.__CSVgetPersonResultClubShort(line)
+        time, coursestatus, resultstatus = self.__CSVgetPersonResultTime(line)
+        if self.ScoreO:
+            score_points = self.__CSVgetPersonResultScorePoints(line)
+            score_penalty = self.__CSVgetPersonResultScorePenalty(line)
+        else:
+            score_points = None
+            score_penalty = None
+        return EventPersonResult(
+            name,
+            None, # Bib
+            None, # SiCard
+            club,
+            coursestatus,
+            resultstatus,
+            time,
+            score_points,
+            score_penalty
+        )
 
 
 ##########
@@ -452,12 +612,12 @@ class OrienteerResultReader(object):
             return self.__CSVgetEventClassShortName(line)
     def __CSVgetPersonResultName(self, line):
         if 'name' in self.csvcols.keys():
-            name = unicode(line[self.csvcols['name']].strip('\"\'\/\\ '), 'utf-8')
-            return unicodedata.normalize('NFKD', name).encode('ascii', 'ignore')
+            name = line[self.csvcols['name']].strip('\"\'\/\\ ')
+            return unicodedata.normalize('NFKD', name).encode('ascii', 'ignore').decode('ascii')
         elif 'first' in self.csvcols.keys() and 'last' in self.csvcols.keys():
-            first = unicode(line[self.csvcols['first']].strip('\"\'\/\\ '), 'utf-8')
-            last = unicode(line[self.csvcols['last']].strip('\"\'\/\\ '), 'utf-8')
-            return unicodedata.normalize('NFKD', first + ' ' + last).encode('ascii', 'ignore')
+            first = line[self.csvcols['first']].strip('\"\'\/\\ ')
+            last = line[self.csvcols['last']].strip('\"\'\/\\ ')
+            return unicodedata.normalize('NFKD', first + ' ' + last).encode('ascii', 'ignore').decode('ascii')
         else:
             return ''
         return 
@@ -2,13 +2,15 @@
 
 import datetime
 import pytz
-import csv, fileinput, sys
+import csv
+from collections import Counter
 import dominate
 from dominate.tags import *
 from flask import flash
+from ._html_stream import HtmlStream
 
 class EventHtmlWriter(object):
-    def __init__(self, event, format='generic', classes=None, results=None, teamclasses=None, teamresults=None, clubcodes=None):
+    def __init__(self, event, format='generic', classes=None, results=None, teamclasses=None, teamresults=None, clubcodes=None, teammembers=None):
         self.event = event
         self.format = format
         self.eventclasses = classes
@@ -16,26 +18,38 @@ class EventHtmlWriter(object):
         self.teamclasses = teamclasses
         self.teamresults = teamresults
         self.clubcodes = clubcodes
-
-    def eventResultIndv(self):
+        self.teammembers = teammembers if teammembers is not None else {} # TeamResult.id: [PersonResult.id]
+
+        # group results once so each class or team lookup is a dict access
+        self.resultsbyid = {}
+        self.classresults = {}
+        for r in (results or []):
+            self.resultsbyid[r.id] = r
+            self.classresults.setdefault(r.classid, []).append(r)
+        self.teamclassresults = {}
+        for r in (teamresults or []):
+            self.teamclassresults.setdefault(r.teamclassid, []).append(r)
+
+    def eventResultIndv(self, renderer='dominate'):
         """
         create an html file with individual, or individual+team results for this event.
+        renderer 'stream' writes the same html as text without a dominate tree.
         """
         if self.format == 'generic':
-            return self.__writeEventResultIndv()
+            return self.__streamEventResultIndv() if renderer == 'stream' else self.__writeEventResultIndv()
         elif self.format == 'coc':
-            return self.__writeEventResultIndv_coc()
+            return self.__streamEventResultIndv_coc() if renderer == 'stream' else self.__writeEventResultIndv_coc()
         else:
             raise KeyError("Unrecognized output format {0}".format(self.format))
 
-    def eventResultTeam(self):
+    def eventResultTeam(self, renderer='dominate'):
         """
         create an html file with team results for this event
         """
         if len(self.teamclasses) == 0:
             return False
         if self.format == 'generic':
-            return self.__writeEventResultTeam()
+            return self.__streamEventResultTeam() if renderer == 'stream' else self.__writeEventResultTeam()
         elif self.format == 'coc':
             return False #team results included on indv result page
         else:
@@ -58,7 +72,7 @@ class EventHtmlWriter(object):
             with div(cls='row').add(div(cls='col-xs-12')):
                 h1('Results for {0}'.format(self.event.name))
                 try:
-                    eventdate = datetime.date(*[int(x) for x in event.date.split('-')])
+                    eventdate = datetime.date(*[int(x) for x in self.event.date.split('-')])
                     p('An orienteering event held at {0} on {1:%d %B %Y}'.format(self.event.venue, eventdate))
                 except:
                     pass
@@ -69,7 +83,7 @@ class EventHtmlWriter(object):
                     div((a(ec.name, href='#{0}'.format(ec.shortname))), cls='col-md-3')
             for ec in self.eventclasses:
                 with div(cls='row').add(div(cls='col-md-8')):
-                    classresults = [r for r in self.personresults if r.classid == ec.id]
+                    classresults = self.classresults.get(ec.id, [])
                     h3(ec.name, id=ec.shortname)
                     t = table(cls='table table-striped table-condensed', id='ResultsTable-{0}'.format(ec.shortname))
                     with t.add(tr(id='column-titles')):
@@ -107,6 +121,72 @@ class EventHtmlWriter(object):
                                 td('{0:d}'.format(int(pr.score))) if pr.score is not None else td()
         return doc # __writeEventResultIndv
 
+    def __streamEventResultIndv(self):
+        s = HtmlStream(doctype='<!DOCTYPE html>')
+        with s.tag('html'):
+            with s.tag('head'):
+                s.leaf('title', 'Event Results')
+                s.leaf('link', rel='stylesheet',
+                       href='https://maxcdn.bootstrapcdn.com/bootstrap/3.3.6/css/bootstrap.min.css',
+                       integrity='sha384-1q8mTJOASx8j1Au+a5WDVnPi2lkFfwwEAa8hDDdjZlpLegxhjVME1fgjWPGmkzs7',
+                       crossorigin='anonymous')
+                s.leaf('link', rel='stylesheet',
+                       href='https://maxcdn.bootstrapcdn.com/font-awesome/4.6.1/css/font-awesome.min.css')
+                s.leaf('meta', name='viewport', content='width=device-width, initial-scale=1.0')
+            with s.tag('body'), s.tag('div', cls='container-fluid'):
+                with s.tag('div', cls='row'), s.tag('div', cls='col-xs-12'):
+                    s.leaf('h1', 'Results for {0}'.format(self.event.name))
+                    try:
+                        eventdate = datetime.date(*[int(x) for x in self.event.date.split('-')])
+                        s.leaf('p', 'An orienteering event held at {0} on {1:%d %B %Y}'.format(self.event.venue, eventdate))
+                    except:
+                        pass
+                    s.leaf('p', 'Competition Classes:')
+                with s.tag('div', cls='row'):
+                    for ec in self.eventclasses:
+                        self.eventclasses.sort(key=lambda x: x.shortname)
+                        with s.tag('div', cls='col-md-3'):
+                            s.leaf('a', ec.name, href='#{0}'.format(ec.shortname))
+                for ec in self.eventclasses:
+                    with s.tag('div', cls='row'), s.tag('div', cls='col-md-8'):
+                        classresults = self.classresults.get(ec.id, [])
+                        s.leaf('h3', ec.name, id=ec.shortname)
+                        with s.tag('table', cls='table table-striped table-condensed', id='ResultsTable-{0}'.format(ec.shortname)):
+                            with s.tag('tr', id='column-titles'):
+                                if ec.scoremethod in ['time', 'worldcup', '1000pts', 'score', 'score1000']:
+                                    classresults = _sortByPosition(classresults)
+                                    s.leaf('th', 'Pos.')
+                                s.leaf('th', 'Name')
+                                if ec.scoremethod in ['alpha']:
+                                    classresults = _sortByName(classresults)
+                                s.leaf('th', 'Club')
+                                if ec.scoremethod in ['score', 'score1000']:
+                                    s.leaf('th', 'Points')
+                                    s.leaf('th', 'Penalty')
+                                    s.leaf('th', 'Total')
+                                s.leaf('th', 'Time')
+                                if ec.scoremethod in ['1000pts', 'worldcup', 'score1000']:
+                                    s.leaf('th', 'Score')
+                            for pr in classresults:
+                                with s.tag('tr'):
+                                    if ec.scoremethod in ['time', 'worldcup', '1000pts', 'score', 'score1000']:
+                                        s.leaf('td', pr.position) if pr.position > 0 else s.leaf('td')
+                                    s.leaf('td', pr.name)
+                                    s.leaf('td', pr.club_shortname) if pr.club_shortname else s.leaf('td')
+                                    if ec.scoremethod in ['score', 'score1000']:
+                                        s.leaf('td', pr.ScoreO_points)
+                                        s.leaf('td', pr.ScoreO_penalty)
+                                        s.leaf('td', pr.ScoreO_net)
+                                    if pr.coursestatus in ['ok']:
+                                        s.leaf('td', pr.timetommmss())
+                                    elif pr.resultstatus in ['ok']:
+                                        s.leaf('td', '{1} {0}'.format(pr.timetommmss(), pr.coursestatus))
+                                    else:
+                                        s.leaf('td', '{1} {2} {0}'.format(pr.timetommmss(), pr.coursestatus, pr.resultstatus))
+                                    if (ec.scoremethod in ['worldcup', '1000pts', 'score1000']):
+                                        s.leaf('td', '{0:d}'.format(int(pr.score))) if pr.score is not None else s.leaf('td')
+        return s # __streamEventResultIndv
+
     def __writeEventResultIndv_coc(self):
         doc = div(cls="LostTimeContent", id="lt-top")
         with doc:
@@ -139,7 +219,7 @@ class EventHtmlWriter(object):
 
             for ec in self.eventclasses:
                 with div(cls="classResults lg-mrg-bottom"):
-                    classresults = [r for r in self.personresults if r.classid == ec.id]
+                    classresults = self.classresults.get(ec.id, [])
                     h3(ec.name, id=ec.shortname)
                     t = table(cls="table table-striped", id='ResultsTable-{0}'.format(ec.shortname)).add(tbody())
                     with t.add(tr(id="column-titles")):
@@ -182,7 +262,7 @@ class EventHtmlWriter(object):
             if len(self.teamclasses) > 0:
                 for tc in self.teamclasses:
                     with div(cls="classResults lg-mrg-bottom"):
-                        classresults = [r for r in self.teamresults if r.teamclassid == tc.id]
+                        classresults = self.teamclassresults.get(tc.id, [])
                         h3(tc.name, id=tc.shortname)
                         t = table(cls='table table-striped', id='TeamResultsTable-{0}'.format(tc.shortname)).add(tbody())
                         with t.add(tr(id='column-titles')):
@@ -201,11 +281,8 @@ class EventHtmlWriter(object):
                                     td(r.teamname_short)
                                 finpct = r.numfinishes if r.numfinishes == 0 else int((float(r.numfinishes)/r.numstarts)*100)
                                 td('{0}% ({1} of {2})'.format(finpct, r.numfinishes, r.numstarts))
-                            try:
-                                memberids = [int(x) for x in r.resultids.split(',')]
-                            except:
-                                memberids = []
-                            members = [x for x in self.personresults if x.id in memberids]
+                            memberids = self.teammembers.get(r.id, [])
+                            members = [self.resultsbyid[x] for x in sorted(memberids) if x in self.resultsbyid]
                             members = _sortByPosition(members)
                             for m in members:
                                 with t.add(tr(cls="team-result-member")):
@@ -237,6 +314,139 @@ class EventHtmlWriter(object):
                 dd("the star indicates course completion status was not reported and may be valid, msp, or dnf")
         return doc # __writeEventResultIndv_coc
 
+    def __streamEventResultIndv_coc(self):
+        s = HtmlStream()
+        with s.tag('div', cls="LostTimeContent", id="lt-top"):
+
+            self.eventclasses.sort(key=lambda x: x.shortname)
+            WIOL = [x for x in self.eventclasses if x.shortname.startswith('W')]
+            if len(WIOL) > 0:
+                # Split Out Public and WIOL individual classes in menu
+                with s.tag('div', cls="lg-mrg-bottom"):
+                    s.leaf('h2', "Winter Series (Public)")
+                    for ec in self.eventclasses:
+                        if ec not in WIOL:
+                            with s.tag('h4'):
+                                s.leaf('a', ec.name, href='#{0}'.format(ec.shortname))
+                with s.tag('div', cls="lg-mrg-bottom"):
+                    s.leaf('h2', "WIOL School League - Individuals")
+                    for ec in WIOL:
+                        with s.tag('h4'):
+                            s.leaf('a', ec.name, href='#{0}'.format(ec.shortname))
+            else:
+                with s.tag('div', cls="lg-mrg-bottom"):
+                    s.leaf('h2', "Event Classes")
+                    for ec in self.eventclasses:
+                        with s.tag('h4'):
+                            s.leaf('a', ec.name, href='#{0}'.format(ec.shortname))
+
+            if len(self.teamclasses) > 0:
+                with s.tag('div', cls="lg-mrg-bottom"):
+                    s.leaf('h2', "WIOL School League - Teams")
+                    for tc in self.teamclasses:
+                        self.teamclasses.sort(key=lambda x: x.shortname)
+                        with s.tag('h4'):
+                            s.leaf('a', tc.name, href='#{0}'.format(tc.shortname))
+
+            for ec in self.eventclasses:
+                with s.tag('div', cls="classResults lg-mrg-bottom"):
+                    classresults = self.classresults.get(ec.id, [])
+                    s.leaf('h3', ec.name, id=ec.shortname)
+                    with s.tag('table', cls="table table-striped", id='ResultsTable-{0}'.format(ec.shortname)), s.tag('tbody'):
+                        with s.tag('tr', id="column-titles"):
+                            if ec.scoremethod in ['time', 'worldcup', '1000pts', 'score', 'score1000']:
+                                classresults = _sortByPosition(classresults)
+                                s.leaf('th', 'Pos.')
+                            s.leaf('th', 'Name')
+                            if ec in WIOL:
+                                s.leaf('th', 'School')
+                            else:
+                                s.leaf('th', 'Club')
+                            if ec.scoremethod in ['score', 'score1000']:
+                                s.leaf('th', 'Points')
+                                s.leaf('th', 'Penalty')
+                                s.leaf('th', 'Total')
+                            s.leaf('th', 'Time', cls="text-right")
+                            if ec.scoremethod in ['1000pts', 'worldcup', 'score1000']:
+                                s.leaf('th', 'Score', cls="text-right")
+                        for pr in classresults:
+                            with s.tag('tr'):
+                                if ec.scoremethod in ['time', 'worldcup', '1000pts', 'score', 'score1000']:
+                                    s.leaf('td', pr.position) if pr.position > 0 else s.leaf('td')
+                                s.leaf('td', pr.name)
+                                s.leaf('td', pr.club_shortname) if pr.club_shortname else s.leaf('td')
+                                if ec.scoremethod in ['score', 'score1000']:
+                                    s.leaf('td', pr.ScoreO_points)
+                                    s.leaf('td', pr.ScoreO_penalty)
+                                    s.leaf('td', pr.ScoreO_net)
+                                if pr.coursestatus in ['ok']:
+                                    s.leaf('td', pr.timetommmss(), cls="text-right")
+                                elif pr.resultstatus in ['ok']:
+                                    s.leaf('td', '{0} {1}'.format(pr.coursestatus, pr.timetommmss()), cls="text-right")
+                                elif pr.resultstatus in ['dns']:
+                                    s.leaf('td', '{0}'.format(pr.resultstatus), cls="text-right")
+                                else:
+                                    s.leaf('td', '{0} {1}*'.format(pr.resultstatus, pr.timetommmss()), cls="text-right")
+                                if (ec.scoremethod in ['worldcup', '1000pts', 'score1000']):
+                                    s.leaf('td', '{0:d}'.format(int(pr.score)), cls="text-right") if pr.score is not None else s.leaf('td')
+                with s.tag('p', cls="lg-mrg-bottom text-center"):
+                    s.leaf('a', "Menu", href="#lt-top")
+            if len(self.teamclasses) > 0:
+                for tc in self.teamclasses:
+                    with s.tag('div', cls="classResults lg-mrg-bottom"):
+                        classresults = self.teamclassresults.get(tc.id, [])
+                        s.leaf('h3', tc.name, id=tc.shortname)
+                        with s.tag('table', cls='table table-striped', id='TeamResultsTable-{0}'.format(tc.shortname)), s.tag('tbody'):
+                            with s.tag('tr', id='column-titles'):
+                                classresults = _sortByPosition(classresults)
+                                s.leaf('th', 'Place')
+                                s.leaf('th', 'Points')
+                                s.leaf('th', 'School / Name')
+                                s.leaf('th', 'Finish')
+                            for r in classresults:
+                                with s.tag('tr', cls="team-result-full"):
+                                    s.leaf('td', r.position) if r.position > 0 else s.leaf('td')
+                                    s.leaf('td', '{0:d}'.format(int(r.score))) if r.score is not None else s.leaf('td')
+                                    try:
+                                        s.leaf('td', '{0} ({1})'.format(self.clubcodes[r.teamname_short][0].name, r.teamname_short))
+                                    except:
+                                        s.leaf('td', r.teamname_short)
+                                    finpct = r.numfinishes if r.numfinishes == 0 else int((float(r.numfinishes)/r.numstarts)*100)
+                                    s.leaf('td', '{0}% ({1} of {2})'.format(finpct, r.numfinishes, r.numstarts))
+                                memberids = self.teammembers.get(r.id, [])
+                                members = [self.resultsbyid[x] for x in sorted(memberids) if x in self.resultsbyid]
+                                members = _sortByPosition(members)
+                                for m in members:
+                                    with s.tag('tr', cls="team-result-member"):
+                                        s.leaf('td')
+                                        s.leaf('td', '{0:d}'.format(int(m.score))) if m.score is not None else s.leaf('td')
+                                        s.leaf('td', '{0} ({1})'.format(m.name, m.club_shortname))
+                                        if m.coursestatus in ['ok']:
+                                            s.leaf('td', m.timetommmss())
+                                        elif m.resultstatus in ['ok']:
+                                            s.leaf('td', '{1} {0}'.format(m.timetommmss(), m.coursestatus))
+                                        else:
+                                            s.leaf('td', '{1} {2} {0}'.format(m.timetommmss(), m.coursestatus, m.resultstatus))
+                    with s.tag('p', cls="lg-mrg-bottom text-center"):
+                        s.leaf('a', "Menu", href="#lt-top")
+            s.leaf('h3', "Result Status Codes")
+            with s.tag('dl', cls="dl-horizontal"):
+                s.leaf('dt', "msp: missing punch")
+                s.leaf('dd', "a control was skipped or taken out of order")
+                s.leaf('dt', "dnf: did not finish")
+                s.leaf('dd', "a control or set of controls at the end of the course were skipped")
+                s.leaf('dt', "nc: not competing")
+                s.leaf('dd', "the competitor is not eligible for standings, such as when running a second course")
+                s.leaf('dt', "dq: disqualified")
+                s.leaf('dd', "breaking competition rules, such as conferring with another competitor or entering an out of bounds area")
+                s.leaf('dt', "ovt: overtime")
+                s.leaf('dd', "returning after the course closure time")
+                s.leaf('dt', "dns: did not start")
+                s.leaf('dd', "the competitor did not start")
+                s.leaf('dt', "<time>*")
+                s.leaf('dd', "the star indicates course completion status was not reported and may be valid, msp, or dnf")
+        return s # __streamEventResultIndv_coc
+
 
     def __writeEventResultTeam(self):
         doc = dominate.document(title='Event Results')
@@ -265,7 +475,7 @@ class EventHtmlWriter(object):
                     div((a(tc.name, href='#{0}'.format(tc.shortname))), cls='col-md-3')
             for tc in self.teamclasses:
                 with div(cls='row').add(div(cls='col-md-8')):
-                    classresults = [r for r in self.teamresults if r.teamclassid == tc.id]
+                    classresults = self.teamclassresults.get(tc.id, [])
                     h3(tc.name, id=tc.shortname)
                     t = table(cls='table table-striped table-condensed', id='TeamResultsTable-{0}'.format(tc.shortname))
                     with t.add(tr(id='column-titles')):
@@ -280,23 +490,68 @@ class EventHtmlWriter(object):
                             td('{0:d}'.format(int(r.score))) if r.score is not None else td()
         return doc # __writeEventResultTeam
 
+    def __streamEventResultTeam(self):
+        s = HtmlStream(doctype='<!DOCTYPE html>')
+        with s.tag('html'):
+            with s.tag('head'):
+                s.leaf('title', 'Event Results')
+                s.leaf('link', rel='stylesheet',
+                       href='https://maxcdn.bootstrapcdn.com/bootstrap/3.3.6/css/bootstrap.min.css',
+                       integrity='sha384-1q8mTJOASx8j1Au+a5WDVnPi2lkFfwwEAa8hDDdjZlpLegxhjVME1fgjWPGmkzs7',
+                       crossorigin='anonymous')
+                s.leaf('link', rel='stylsheet',
+                       href='https://maxcdn.bootstrapcdn.com/font-awesome/4.6.1/css/font-awesome.min.css')
+                s.leaf('meta', name='viewport', content='width=device-width, initial-scale=1.0')
+            with s.tag('body'), s.tag('div', cls='container-fluid'):
+                with s.tag('div', cls='row'), s.tag('div', cls='col-xs-12'):
+                    s.leaf('h1', 'Team Results for {0}'.format(self.event.name))
+                    try:
+                        eventdate = datetime.date(*[int(x) for x in self.event.date.split('-')])
+                        s.leaf('p', 'An orienteering event held at {0} on {1:%d %B %Y}'.format(self.event.venue, eventdate))
+                    except:
+                        pass
+                    s.leaf('p', 'Team Competition Classes:')
+                with s.tag('div', cls='row'):
+                    for tc in self.teamclasses:
+                        self.teamclasses.sort(key=lambda x: x.shortname)
+                        with s.tag('div', cls='col-md-3'):
+                            s.leaf('a', tc.name, href='#{0}'.format(tc.shortname))
+                for tc in self.teamclasses:
+                    with s.tag('div', cls='row'), s.tag('div', cls='col-md-8'):
+                        classresults = self.teamclassresults.get(tc.id, [])
+                        s.leaf('h3', tc.name, id=tc.shortname)
+                        with s.tag('table', cls='table table-striped table-condensed', id='TeamResultsTable-{0}'.format(tc.shortname)):
+                            with s.tag('tr', id='column-titles'):
+                                classresults = _sortByPosition(classresults)
+                                s.leaf('th', 'Pos.')
+                                s.leaf('th', 'Name')
+                                s.leaf('th', 'Score')
+                            for r in classresults:
+                                with s.tag('tr'):
+                                    s.leaf('td', r.position) if r.position > 0 else s.leaf('td')
+                                    s.leaf('td', r.teamname_short)
+                                    s.leaf('td', '{0:d}'.format(int(r.score))) if r.score is not None else s.leaf('td')
+        return s # __streamEventResultTeam
+
 
 class SeriesHtmlWriter(object):
-    def __init__(self, series, format='generic', seriesclasses=None, results=None, clubcodes=None):
+    def __init__(self, series, format='generic', seriesclasses=None, results=None, clubcodes=None, eventids=None):
         self.series = series
         self.format = format
         self.seriesclasses = seriesclasses
         self.results = results
         self.clubcodes = clubcodes
+        self.eventids = eventids if eventids is not None else [] # in series order
 
-    def seriesResult(self):
+    def seriesResult(self, renderer='dominate'):
         """
         create an html file with series results for this event.
+        renderer 'stream' writes the same html as text without a dominate tree.
         """
         if self.format == 'generic':
-            return self.__writeSeriesResult()
+            return self.__streamSeriesResult_coc() if renderer == 'stream' else self.__writeSeriesResult()
         elif self.format == 'coc':
-            return self.__writeSeriesResult_coc()
+            return self.__streamSeriesResult_coc() if renderer == 'stream' else self.__writeSeriesResult_coc()
         else:
             raise KeyError("Unrecognized output format {0}".format(self.format))
 
@@ -322,13 +577,13 @@ class SeriesHtmlWriter(object):
                         th('Name') if sc.classtype == 'indv' else th('Team')
                         if sc.classtype == 'indv':
                             th('School') if sc.shortname.startswith('W') else th('Club')
-                        for i in range(1, len(self.series.eventids.split(','))+1):
+                        for i in range(1, len(self.eventids)+1):
                             th('#{0}'.format(i))
                         th('Season')
                     for r in self.results[sc.shortname]:
                         bestscores = r['scores'][:self.series.scoreeventscount]
                         scores = []
-                        for eid in [int(x) for x in self.series.eventids.split(',')]:
+                        for eid in self.eventids:
                             try:
                                 scores.append((int(r['results'][eid].score), int(r['results'][eid].position)))
                             except:
@@ -362,6 +617,63 @@ class SeriesHtmlWriter(object):
                             td(int(r['score']))
         return doc
 
+    def __streamSeriesResult_coc(self):
+        s = HtmlStream()
+        with s.tag('div', cls="LostTimeContent"):
+            s.leaf('style', ".season1{ color: Red;} .season2{ color: Crimson;} .season3{ color: FireBrick;} .season-pts{ text-decoration: underline;}")
+            with s.tag('div', cls="lg-mrg-bottom"):
+                s.leaf('h2', "Season Standings")
+                self.seriesclasses.sort(key=lambda x: x.shortname)
+                for sc in self.seriesclasses:
+                    with s.tag('h4'):
+                        s.leaf('a', sc.name, href='#{0}'.format(sc.shortname))
+            for sc in self.seriesclasses:
+                with s.tag('div', cls="classResults lg-mrg-bottom", id=sc.shortname):
+                    s.leaf('h3', sc.name)
+                    with s.tag('table', cls="table table-striped"):
+                        with s.tag('tr', id='column-titles'):
+                            s.leaf('th', 'Place')
+                            s.leaf('th', 'Name') if sc.classtype == 'indv' else s.leaf('th', 'Team')
+                            if sc.classtype == 'indv':
+                                s.leaf('th', 'School') if sc.shortname.startswith('W') else s.leaf('th', 'Club')
+                            for i in range(1, len(self.eventids)+1):
+                                s.leaf('th', '#{0}'.format(i))
+                            s.leaf('th', 'Season')
+                        for r in self.results[sc.shortname]:
+                            bestscores = r['scores'][:self.series.scoreeventscount]
+                            scores = []
+                            for eid in self.eventids:
+                                try:
+                                    scores.append((int(r['results'][eid].score), int(r['results'][eid].position)))
+                                except:
+                                    scores.append(('--', False))
+                            with s.tag('tr'):
+                                s.leaf('td', r['position'])
+                                if sc.classtype == 'indv':
+                                    s.leaf('td', r['name'])
+                                    s.leaf('td', r['club']) if r['club'] != None else s.leaf('td')
+                                elif sc.classtype == 'team':
+                                    s.leaf('td', "{0} ({1})".format(self.clubcodes[r['name']][0].name, r['name']))
+
+                                for score in scores:
+                                    score_decorators = ''
+                                    if score[0] in bestscores:
+                                        score_decorators = 'season-pts'
+                                        bestscores.remove(score[0])
+                                    if score[1] == 1:
+                                        score_decorators += " season1"
+                                    elif score[1] == 2:
+                                        score_decorators += " season2"
+                                    elif score[1] == 3:
+                                        score_decorators += " season3"
+                                    if score_decorators != '':
+                                        s.leaf('td', score[0], cls=score_decorators)
+                                    else:
+                                        s.leaf('td', score[0])
+
+                                s.leaf('td', int(r['score']))
+        return s
+
 
 
 class EntryWriter(object):
@@ -375,70 +687,73 @@ class EntryWriter(object):
         self.eventtype = eventtype
         self.epunch = True if punchtype == 'epunch' else False
         self.bibnum = _nextbib(bibstart)
+        self.categories = Counter() # class: entries written, filled in while writing OE entries
 
-    def writeEntries(self):
+    def writeEntries(self, out=None):
+        """
+        Write the entries to out, a file open for writing, as they are read.
+        Without out, return the whole document as a string.
+        """
         if self.format == 'OE':
-            return self.__writeOEentries()
+            chunks = self.__writeOEentries()
         elif self.format == 'CheckIn' or self.format == 'CheckInNationalMeet':
-            return self.__writeCheckInEntries()
+            chunks = self.__writeCheckInEntries()
         else:
             raise KeyError("Unrecognized output format for entries: {}".format(self.format))
+        if out is None:
+            return ''.join(chunks)
+        out.writelines(chunks)
+        return
+
+    def __readEntries(self):
+        """
+        yield (datacols, line) for each entry line of each file
+        """
+        for f in self.files:
+            with open(f, 'r') as currentfile:
+                regreader = csv.reader(_stripNul(currentfile), delimiter=',')
+                datacols = self.__identify_columns(next(regreader))
+                for line in regreader:
+                    yield datacols, line
 
     def __writeOEentries(self):
         template = ';{0};;{1};;{2};{3};{4};{5};;{6};;;;0;;;;;;{7};;;;;{8};;;;;;;;;;;;;;;;;;;;;;;{9};0;X;;;;;;\n'
-        doc = ''
         prefix = 'OESco0001;' if self.eventtype == 'score' else 'OE0001;'
         header = prefix + 'Stno;XStno;Chipno;Database Id;Surname;First name;YB;S;Block;nc;Start;Finish;Time;Classifier;Credit -;Penalty +;Comment;Club no.;Cl.name;City;Nat;Location;Region;Cl. no.;Short;Long;Entry cl. No;Entry class (short);Entry class (long);Rank;Ranking points;Num1;Num2;Num3;Text1;Text2;Text3;Addr. surname;Addr. first name;Street;Line2;Zip;Addr. city;Phone;Mobile;Fax;EMail;Rented;Start fee;Paid;Team;Course no.;Course;km;m;Course controls\n'
-        doc += header
-        bibs = []
+        yield header
+        bibs = set()
         bibs_dupes_exist = False
-        for f in self.files:
-
-            for line in fileinput.input(files=(f), inplace=True):
-                # for line in rawfile:
-                line = line.replace('\0', '')
-                sys.stdout.write(line)
-
-            with open(f, 'r') as currentfile:
-                regreader = csv.reader(currentfile, delimiter=',')
-                datacols = self.__identify_columns(next(regreader))
-
-                known_renting = True if 'rented' in datacols.keys() else False
-                known_bib = True if 'stno' in datacols.keys() else False
-                known_nc = True if 'nc' in datacols.keys() else False
-
-                for line in regreader:
-                    first = line[datacols['first']].strip('\"\'\/\\ ') if 'first' in datacols.keys() else ''
-                    last = line[datacols['last']].strip('\"\'\/\\ ') if 'last' in datacols.keys() else ''
-                    yb = line[datacols['yb']].strip('\"\'\/\\ ') if 'yb' in datacols.keys() else ''
-                    club = line[datacols['club']].strip('\"\'\/\\ ') if 'club' in datacols.keys() else ''
-                    cat = line[datacols['cat']].strip('\"\'\/\\ ') if 'cat' in datacols.keys() else ''
-                    sex = line[datacols['sex']].strip('\"\'\/\\ ') if 'sex' in datacols.keys() else ''
-                    punch = line[datacols['punch']].strip('\"\'\/\\ ') if 'punch' in datacols.keys() else ''
-                    if (first == '') and (last == '') and (club == '') and (cat == ''):
-                        continue
-                    if known_renting:
-                        rented = line[datacols['rented']].strip('\"\'\/\\ ')
-                    else:
-                        rented = 'X' if len(punch) == 0 else ''
-                    if known_bib:
-                        stno = line[datacols['stno']].strip('\"\'\/\\ ')
-                        if len(stno) == 0:
-                            stno = next(self.bibnum)
-                    else:
-                        stno = next(self.bibnum)
-                    if known_nc:
-                        nc = line[datacols['nc']].strip('\"\'\/\\ ')
-                    else:
-                        nc = '0'
-                    if stno in bibs:
-                        bibs_dupes_exist = True
-                    bibs.append(stno)
-                    regline = template.format(stno, punch, last, first, yb, sex, nc, club, cat, rented)
-                    doc += regline
+        for datacols, line in self.__readEntries():
+            first = line[datacols['first']].strip('\"\'\/\\ ') if 'first' in datacols.keys() else ''
+            last = line[datacols['last']].strip('\"\'\/\\ ') if 'last' in datacols.keys() else ''
+            yb = line[datacols['yb']].strip('\"\'\/\\ ') if 'yb' in datacols.keys() else ''
+            club = line[datacols['club']].strip('\"\'\/\\ ') if 'club' in datacols.keys() else ''
+            cat = line[datacols['cat']].strip('\"\'\/\\ ') if 'cat' in datacols.keys() else ''
+            sex = line[datacols['sex']].strip('\"\'\/\\ ') if 'sex' in datacols.keys() else ''
+            punch = line[datacols['punch']].strip('\"\'\/\\ ') if 'punch' in datacols.keys() else ''
+            if (first == '') and (last == '') and (club == '') and (cat == ''):
+                continue
+            if 'rented' in datacols.keys():
+                rented = line[datacols['rented']].strip('\"\'\/\\ ')
+            else:
+                rented = 'X' if len(punch) == 0 else ''
+            if 'stno' in datacols.keys():
+                stno = line[datacols['stno']].strip('\"\'\/\\ ')
+                if len(stno) == 0:
+                    stno = next(self.bibnum)
+            else:
+                stno = next(self.bibnum)
+            if 'nc' in datacols.keys():
+                nc = line[datacols['nc']].strip('\"\'\/\\ ')
+            else:
+                nc = '0'
+            if stno in bibs:
+                bibs_dupes_exist = True
+            bibs.add(stno)
+            self.categories[cat] += 1
+            yield template.format(stno, punch, last, first, yb, sex, nc, club, cat, rented)
         if bibs_dupes_exist:
             flash("Detected entries with non-unique start/bib numbers.", 'danger')
-        return doc
 
     def __writeCheckInEntries(self):
         if self.epunch:
@@ -472,58 +787,6 @@ class EntryWriter(object):
         
             MANUAL_TEMPLATE = '<tr><td class="check">{}</td><td>{}</td><td>{}</td><td class="owes">{}</td><td>{}</td><td>{}</td><td class="phone">{}</td><td class="phone">{}</td><td class="license">{}</td></tr>\n'
 
-        for f in self.files:
-
-            for line in fileinput.input(files=(f), inplace=True):
-                line = line.replace('\0', '')
-                sys.stdout.write(line)
-
-            with open(f, 'r') as currentfile:
-                regreader = csv.reader(currentfile, delimiter=',')
-                datacols = self.__identify_columns(next(regreader))
-                
-                for line in regreader:
-                    first = line[datacols['first']].strip('\"\'\/\\ ').replace('_', ' ') if 'first' in datacols.keys() else ''
-                    last = line[datacols['last']].strip('\"\'\/\\ ').replace('_', ' ') if 'last' in datacols.keys() else ''
-                    club = line[datacols['club']].strip('\"\'\/\\ ') if 'club' in datacols.keys() else ''
-                    cat = line[datacols['cat']].strip('\"\'\/\\ ') if 'cat' in datacols.keys() else ''
-                    sex = line[datacols['sex']].strip('\"\'\/\\ ') if 'sex' in datacols.keys() else ''
-                    punch = line[datacols['punch']].strip('\"\'\/\\ ') if ('punch' in datacols.keys() and self.epunch) else ''
-                    paid = line[datacols['paid']].strip('\"\'\/\\ ') if 'paid' in datacols.keys() else '?'
-                    owed = line[datacols['owed']].strip('\"\'\/\\ ') if 'owed' in datacols.keys() else ''
-                    phone = line[datacols['phone1']].strip('\"\'\/\\ ').replace('\\', ' ').replace('/', ' ').replace('-', '.') if 'phone1' in datacols.keys() else ''
-                    phone2 = line[datacols['phone2']].strip('\"\'\/\\ ').replace('\\', ' ').replace('/', ' ').replace('-', '.') if 'phone2' in datacols.keys() else ''
-                    license = line[datacols['license']].strip('\"\'\/\\ ') if 'license' in datacols.keys() else ''
-
-                    rental = True if len(punch) == 0 else False
-                    paid = True if len(owed) == 0 else False
-                    
-
-                    if (first == '') and (last == '') and (club == '') and (cat == ''):
-                        continue
-                    if not paid:
-                        owed = '${}'.format(owed)
-                        box = owed
-                    else:
-                        box = ''
-
-                    if rental and self.epunch:
-                        newline = RENT_TEMPLATE.format(box, first, last, owed, cat, club, phone, phone2, license)
-                        rentalDoc += newline
-                    elif self.epunch:
-                        newline = OWN_TEMPLATE.format(box, first, last, owed, cat, punch, club, phone, phone2, license)
-                        ownersDoc += newline
-                    else:
-                        newline = MANUAL_TEMPLATE.format(box, first, last, owed, cat, club, phone, phone2, license)
-                        manualDoc += newline
-        
-        if self.epunch:
-            rentalDocA += rentalDoc + '</table>\n'
-            rentalDocB += rentalDoc + '</table>\n'
-            ownersDoc += '</table>\n'
-        else:
-            manualDoc += '</table>\n'
-
         pacificTZ = pytz.timezone('US/Pacific')
         utc = pytz.timezone('UTC')
         now = utc.localize(datetime.datetime.utcnow())
@@ -533,11 +796,52 @@ class EntryWriter(object):
         header = '<!DOCTYPE html><html>\n<head>\n' + timestamp + '</head>\n'
         pagebreak = '\n<p style="page-break-before: always" ></p>\n'
 
+        yield header
+        yield ownersDoc if self.epunch else manualDoc
+
+        # owned e-punch and manual punch rows stream out, rental rows are
+        # printed twice after them so they wait in a list
+        rentals = []
+        for datacols, line in self.__readEntries():
+            first = line[datacols['first']].strip('\"\'\/\\ ').replace('_', ' ') if 'first' in datacols.keys() else ''
+            last = line[datacols['last']].strip('\"\'\/\\ ').replace('_', ' ') if 'last' in datacols.keys() else ''
+            club = line[datacols['club']].strip('\"\'\/\\ ') if 'club' in datacols.keys() else ''
+            cat = line[datacols['cat']].strip('\"\'\/\\ ') if 'cat' in datacols.keys() else ''
+            sex = line[datacols['sex']].strip('\"\'\/\\ ') if 'sex' in datacols.keys() else ''
+            punch = line[datacols['punch']].strip('\"\'\/\\ ') if ('punch' in datacols.keys() and self.epunch) else ''
+            paid = line[datacols['paid']].strip('\"\'\/\\ ') if 'paid' in datacols.keys() else '?'
+            owed = line[datacols['owed']].strip('\"\'\/\\ ') if 'owed' in datacols.keys() else ''
+            phone = line[datacols['phone1']].strip('\"\'\/\\ ').replace('\\', ' ').replace('/', ' ').replace('-', '.') if 'phone1' in datacols.keys() else ''
+            phone2 = line[datacols['phone2']].strip('\"\'\/\\ ').replace('\\', ' ').replace('/', ' ').replace('-', '.') if 'phone2' in datacols.keys() else ''
+            license = line[datacols['license']].strip('\"\'\/\\ ') if 'license' in datacols.keys() else ''
+
+            rental = True if len(punch) == 0 else False
+            paid = True if len(owed) == 0 else False
+
+
+            if (first == '') and (last == '') and (club == '') and (cat == ''):
+                continue
+            if not paid:
+                owed = '${}'.format(owed)
+                box = owed
+            else:
+                box = ''
+
+            if rental and self.epunch:
+                rentals.append(RENT_TEMPLATE.format(box, first, last, owed, cat, club, phone, phone2, license))
+            elif self.epunch:
+                yield OWN_TEMPLATE.format(box, first, last, owed, cat, punch, club, phone, phone2, license)
+            else:
+                yield MANUAL_TEMPLATE.format(box, first, last, owed, cat, club, phone, phone2, license)
+        yield '</table>\n'
+
         if self.epunch:
-            doc = header + ownersDoc + pagebreak + rentalDocA + pagebreak + rentalDocB + '</body></html>\n'
-        else:
-            doc = header + manualDoc + '</body></html>\n'
-        return doc
+            for rentalhead in [rentalDocA, rentalDocB]:
+                yield pagebreak + rentalhead + rentalDoc
+                for newline in rentals:
+                    yield newline
+                yield '</table>\n'
+        yield '</body></html>\n'
 
 
     def __identify_columns(self, headerline):
@@ -617,3 +921,8 @@ def _nextbib(initial=1001):
     while True:
         yield i
         i += 1
+
+def _stripNul(lines):
+    """Drop NUL bytes, which csv.reader refuses, from each line as it is read"""
+    for line in lines:
+        yield line.replace('\0', '')
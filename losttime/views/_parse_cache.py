@@ -0,0 +1,121 @@
+# losttime/views/_parse_cache.py
+#
+# Clubs often upload the same results file again and again while they fix
+# class names. Parsed uploads are kept on disk under the sha256 of the file,
+# so an identical upload skips OrienteerResultReader. Entries are gzipped json
+# arrays, the least recently used are deleted once the cache grows past
+# PARSE_CACHE_BYTES. Set PARSE_CACHE_BYTES = 0 in the config to turn it off.
+# The cache is best effort, a file error is logged and never fails an upload.
+
+import gzip
+import hashlib
+import json
+import os
+import tempfile
+from datetime import datetime
+from losttime import app
+from ._orienteer_data import Event, EventClass, EventPersonResult
+
+CACHE_FORMAT = 2 # bump when the reader or the layout below changes
+DATE_FORMAT = '%Y-%m-%dT%H:%M:%S'
+
+
+def parseCacheKey(path, isScoreO):
+    """Cache key for an uploaded results file read as score-O or not"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 16), b''):
+            digest.update(chunk)
+    ext = path.rsplit('.', 1)[-1].lower()
+    return '{0}-{1}-{2}-{3}'.format(digest.hexdigest(), ext, 'score' if isScoreO else 'standard', CACHE_FORMAT)
+
+
+def parseCacheEnabled():
+    """False when PARSE_CACHE_BYTES turns the cache off"""
+    return app.config.get('PARSE_CACHE_BYTES', 0) > 0
+
+
+def loadParsedEvent(key):
+    """(Event, [(EventClass, [EventPersonResult])]) saved for key, or None"""
+    if not parseCacheEnabled():
+        return None
+    path = _entryFile(key)
+    try:
+        with gzip.open(path, 'rt', encoding='utf-8') as f:
+            saved = json.load(f)
+        os.utime(path) # most recently used
+    except (OSError, ValueError):
+        return None
+    name, date, venue = saved['event']
+    event = Event(name, datetime.strptime(date, DATE_FORMAT) if date else None, venue)
+    classresults = []
+    for ecevent, ecname, shortname, scoremethod, rows in saved['classes']:
+        ec = EventClass(ecevent, ecname, shortname)
+        ec.scoremethod = scoremethod
+        classresults.append((ec, [EventPersonResult(*row) for row in rows]))
+    return event, classresults
+
+
+def saveParsedEvent(key, event, classresults):
+    """Keep a parsed upload for key, then trim the cache to its size limit"""
+    if not parseCacheEnabled():
+        return
+    saved = {
+        'event': [event.name, event.date.strftime(DATE_FORMAT) if event.date else None, event.venue],
+        'classes': [[ec.event, ec.name, ec.shortname, ec.scoremethod,
+                     [[r.name, r.bib, r.sicard, r.clubshortname, r.coursestatus, r.resultstatus,
+                       r.time, r.ScoreO_points, r.ScoreO_penalty, r.splits] for r in results]]
+                    for ec, results in classresults]
+    }
+    try:
+        _write(_entryFile(key), saved)
+    except OSError:
+        app.logger.exception('Could not save parsed upload {0}'.format(key))
+        return
+    _evict(app.config.get('PARSE_CACHE_BYTES', 0))
+
+
+def _write(path, saved):
+    # each writer gets its own temp file, the same file can be uploaded twice at once
+    os.makedirs(_cacheDir(), exist_ok=True)
+    fd, partial = tempfile.mkstemp(dir=_cacheDir(), suffix='.part')
+    try:
+        with os.fdopen(fd, 'wb') as raw, gzip.open(raw, 'wt', encoding='utf-8') as f:
+            json.dump(saved, f, separators=(',', ':'))
+        os.replace(partial, path)
+    finally:
+        if os.path.exists(partial):
+            os.remove(partial)
+
+
+def _evict(limit):
+    try:
+        names = os.listdir(_cacheDir())
+    except OSError:
+        app.logger.exception('Could not trim the parse cache')
+        return
+    entries = []
+    for fn in names:
+        if fn.endswith('.json.gz'):
+            try:
+                stat = os.stat(os.path.join(_cacheDir(), fn))
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, fn))
+    total = sum(size for mtime, size, fn in entries)
+    for mtime, size, fn in sorted(entries):
+        if total <= limit:
+            break
+        try:
+            os.remove(os.path.join(_cacheDir(), fn))
+        except OSError:
+            pass # another worker got there first
+        total -= size
+
+
+def _cacheDir():
+    return os.path.join(app.instance_path, 'parsecache')
+
+
+def _entryFile(key):
+    return os.path.join(_cacheDir(), key + '.json.gz')
@@ -0,0 +1,123 @@
+# losttime/views/_scoring.py
+#
+# Positions and scores for every PersonResult in an event, computed on
+# NumPy arrays. Results are read with a single query and written back with
+# a single bulk update instead of a query and a Python loop per class.
+
+import numpy as np
+from losttime.models import db, EventClass, PersonResult
+
+RANKED_BY_TIME = ['time', 'worldcup', '1000pts']
+RANKED_BY_SCORE = ['score', 'score1000']
+
+
+def scoreEvent(eventid):
+    """Assign PersonResult.position and PersonResult.score for an event
+
+    Positions use competition ranking: ties share a place and the next
+    finisher is bumped down, so the first 5 places with a tie for 2nd are
+    1, 2, 2, 4, 5. Invalid results (course or result status not 'ok') are
+    assigned a place of -1.
+        'time', 'worldcup', '1000pts': ranked by time
+        'score', 'score1000': ranked by ScoreO_net, then time
+    Scores by EventClass.scoremethod:
+        'worldcup': 100, 95, 92, 90, 89, 88, 87, ...
+        '1000pts': round ( (winning time / competitor time) * 1000 )
+        'time': duplicates the time to the score column (integer seconds)
+        'score': the ScoreO net points
+        'score1000': 1000pts by time for everyone who got the winning
+            points, then points scaled to the slowest of those
+    Classes using 'alpha', 'hide', '' or an unknown method are left alone.
+    """
+    methods = dict(db.session.query(EventClass.id, EventClass.scoremethod).filter_by(eventid=eventid))
+    rows = db.session.query(PersonResult.id,
+                            PersonResult.classid,
+                            PersonResult.time,
+                            PersonResult.coursestatus,
+                            PersonResult.resultstatus,
+                            PersonResult.ScoreO_net).filter_by(eventid=eventid).all()
+    if len(rows) == 0:
+        return
+
+    ids = np.array([r.id for r in rows])
+    classids = np.array([r.classid for r in rows])
+    time = np.array([r.time for r in rows], dtype=float)
+    net = np.array([r.ScoreO_net for r in rows], dtype=float)
+    valid = np.array([r.coursestatus == 'ok' and r.resultstatus == 'ok' for r in rows])
+    nc = np.array([r.resultstatus == 'nc' for r in rows])
+    method = np.array([methods.get(c) or '' for c in classids])
+
+    # class ids to 0..n-1 so per class values can live in flat arrays
+    classkeys, cidx = np.unique(classids, return_inverse=True)
+
+    position = np.full(len(rows), -1)
+    bytime = np.isin(method, RANKED_BY_TIME) & valid
+    position[bytime] = _competitionRank(cidx[bytime], time[bytime])
+    byscore = np.isin(method, RANKED_BY_SCORE) & valid
+    position[byscore] = _competitionRank(cidx[byscore], -net[byscore], time[byscore])
+
+    score = np.full(len(rows), np.nan)
+    ranked = position > 0
+    winner = position == 1
+    win_time = np.zeros(len(classkeys))
+    win_time[cidx[winner]] = time[winner]
+    win_score = np.full(len(classkeys), np.nan)
+    win_score[cidx[winner]] = net[winner]
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        m = method == 'worldcup'
+        worldcup = np.select([position == 1, position == 2, position == 3], [100, 95, 92], 94 - position)
+        worldcup = np.where((position == -1) | (position >= 94), np.where(nc, np.nan, 0), worldcup)
+        score[m] = worldcup[m]
+
+        m = method == '1000pts'
+        ratio = np.round(win_time[cidx] / time * 1000)
+        score[m] = np.where(ranked, ratio, 0)[m]
+
+        m = method == 'time'
+        score[m] = np.where(ranked, time, 0)[m]
+
+        m = method == 'score'
+        score[m] = np.where(ranked, net, 0)[m]
+
+        m = method == 'score1000'
+        sweep = m & (net == win_score[cidx])
+        score[sweep] = ratio[sweep]
+        slowest = np.full(len(classkeys), np.inf)
+        counted = sweep & (score > 0)
+        np.minimum.at(slowest, cidx[counted], score[counted])
+        scaled = np.round(net / win_score[cidx] * slowest[cidx])
+        rest = m & ~sweep
+        score[rest] = np.where(ranked, scaled, 0)[rest]
+
+    update = np.isin(method, RANKED_BY_TIME + RANKED_BY_SCORE)
+    db.session.bulk_update_mappings(PersonResult, [
+        {'id': int(i), 'position': int(p), 'score': None if np.isnan(s) else float(s)}
+        for i, p, s in zip(ids[update], position[update], score[update])])
+    db.session.commit()
+    return
+
+
+def _competitionRank(groups, *keys):
+    """Competition ranking (1, 2, 2, 4) within each group
+
+    keys are sort keys, most significant first, lowest value ranks first.
+    Rows tie when every key matches. Returns positions in input order.
+    """
+    n = len(groups)
+    positions = np.zeros(n, dtype=int)
+    if n == 0:
+        return positions
+    order = np.lexsort(tuple(reversed(keys)) + (groups,))
+    idx = np.arange(n)
+    g = groups[order]
+    newgroup = np.ones(n, dtype=bool)
+    newgroup[1:] = g[1:] != g[:-1]
+    newrun = newgroup.copy()
+    for k in keys:
+        k = k[order]
+        newrun[1:] |= k[1:] != k[:-1]
+    groupstart = np.maximum.accumulate(np.where(newgroup, idx, 0))
+    runstart = np.maximum.accumulate(np.where(newrun, idx, 0))
+    positions[order] = runstart - groupstart + 1
+    return positions
@@ -0,0 +1,131 @@
+# losttime/views/_splits.py
+#
+# Split times from IOF xml results. Each result's times are packed into a
+# ResultSplits row at upload. Processing the event ranks every leg among the
+# class's runners who visited the same controls and estimates the time lost
+# on it, so the split page only unpacks saved arrays.
+#
+# Time loss follows the usual split analysis estimate: a leg's reference
+# time is the median of its fastest quarter of times, a runner's pace is the
+# median of their leg time / reference over all legs, and the time lost on a
+# leg is how much longer it took than reference * pace.
+
+import struct
+from statistics import median
+from losttime.models import db, EventClass, PersonResult, ResultSplits
+
+NONE = -1 # saved in place of a missing time, place or loss
+SPLIT_FIELDS = ['time', 'splitrank', 'leg', 'legrank', 'loss']
+
+
+def packSplits(splits, finish):
+    """(controls, times) columns for the reader's splits and finish time"""
+    controls = ','.join(code or '' for code, time in splits)
+    times = [NONE if time is None else time for code, time in splits]
+    times.append(NONE if finish is None else finish)
+    return controls, _pack(times)
+
+
+def analyzeSplits(eventid):
+    """Save leg places, places at each control and time loss for an event"""
+    courses = {}
+    for r in db.session.query(ResultSplits.resultid, ResultSplits.classid, ResultSplits.controls, ResultSplits.times). \
+                 filter_by(eventid=eventid):
+        courses.setdefault((r.classid, r.controls), []).append((r.resultid, _unpack(r.times)))
+    if len(courses) == 0:
+        return
+    updates = []
+    for runners in courses.values():
+        updates.extend(_analyzeCourse(runners))
+    db.session.bulk_update_mappings(ResultSplits, updates)
+    db.session.commit()
+    return
+
+
+def eventSplits(eventid):
+    """Split tables for the split page, one per class and set of controls
+
+    Returns [(EventClass, [control code], [(PersonResult, [split])])] where
+    each split is a dict of time, splitrank, leg, legrank and loss, one per
+    control then the finish, None where there is no value.
+    """
+    classes = EventClass.query.filter_by(eventid=eventid).filter(EventClass.scoremethod != 'hide'). \
+                  order_by(EventClass.id).all()
+    courses = {}
+    for rs, pr in db.session.query(ResultSplits, PersonResult). \
+                      join(PersonResult, PersonResult.id == ResultSplits.resultid). \
+                      filter(ResultSplits.eventid == eventid):
+        times = _unpack(rs.times)
+        blank = [NONE] * len(times) # not analyzed yet
+        columns = zip(times, _unpack(rs.splitranks) or blank, _legs(times),
+                      _unpack(rs.legranks) or blank, _unpack(rs.timeloss) or blank)
+        splits = [{field: None if value == NONE else value for field, value in zip(SPLIT_FIELDS, values)}
+                  for values in columns]
+        courses.setdefault(rs.classid, {}).setdefault(rs.controls, []).append((pr, splits))
+    tables = []
+    for ec in classes:
+        for controls, runners in sorted(courses.get(ec.id, {}).items()):
+            # placed runners first, then the rest by time
+            runners.sort(key=lambda x: (x[0].position is None or x[0].position < 1,
+                                        x[0].position or 0,
+                                        x[0].time if x[0].time is not None else float('inf')))
+            tables.append((ec, controls.split(','), runners))
+    return tables
+
+
+def _analyzeCourse(runners):
+    legs = [_legs(times) for resultid, times in runners]
+    legranks = _rank(legs)
+    splitranks = _rank([times for resultid, times in runners])
+
+    reference = []
+    for column in zip(*legs):
+        fastest = sorted(x for x in column if x != NONE)
+        reference.append(median(fastest[:max(1, len(fastest) // 4)]) if fastest else 0)
+
+    updates = []
+    for (resultid, times), runnerlegs, lr, sr in zip(runners, legs, legranks, splitranks):
+        ratios = [leg / ref for leg, ref in zip(runnerlegs, reference) if leg != NONE and ref > 0]
+        pace = median(ratios) if ratios else None
+        loss = [NONE if leg == NONE or ref <= 0 or pace is None else max(0, int(round(leg - ref * pace)))
+                for leg, ref in zip(runnerlegs, reference)]
+        updates.append({'resultid': resultid,
+                        'legranks': _pack(lr),
+                        'splitranks': _pack(sr),
+                        'timeloss': _pack(loss)})
+    return updates
+
+
+def _rank(rows):
+    """Competition ranking of each column of rows, smallest first"""
+    ranks = [[NONE] * len(row) for row in rows]
+    for k in range(len(rows[0])):
+        column = sorted((row[k], i) for i, row in enumerate(rows) if row[k] != NONE)
+        for j, (value, i) in enumerate(column):
+            if j == 0 or value != column[j - 1][0]:
+                place = j + 1
+            ranks[i][k] = place
+    return ranks
+
+
+def _legs(times):
+    """Time of each leg from the times at each control"""
+    legs = []
+    previous = 0
+    for t in times:
+        if t == NONE or previous == NONE or t < previous:
+            legs.append(NONE)
+        else:
+            legs.append(t - previous)
+        previous = t
+    return legs
+
+
+def _pack(values):
+    return struct.pack('<{0}i'.format(len(values)), *values)
+
+
+def _unpack(blob):
+    if blob is None:
+        return None
+    return list(struct.unpack('<{0}i'.format(len(blob) // 4), blob))
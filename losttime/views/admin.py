@@ -7,6 +7,7 @@ import flask_login
 from losttime.models import db, User, ClubCode, Event, Series
 from losttime.mailman import send_email
 from losttime import requires_mod
+from ._club_codes import invalidateClubCodes
 
 
 admin = Blueprint("admin", __name__, static_url_path='/download', static_folder='../static/adminfiles')
@@ -51,6 +52,7 @@ def admin_club_codes():
                 db.session.add(nc)
                 created += 1
         db.session.commit()
+        invalidateClubCodes()
         flash("Matched: {} Updated: {} Created: {}".format(matched, updated, created), 'info')
         return "Matched: {} Updated: {} Created: {}".format(matched, updated, created), 201
 
@@ -6,6 +6,7 @@ from functools import wraps
 import json
 
 from losttime import app
+from ._club_codes import invalidateClubCodes
 
 def check_auth(username, password):
     """This function is called to check if a username /
@@ -64,6 +65,7 @@ def clubcode():
                 db.session.add(nc)
                 created += 1
         db.session.commit()
+        invalidateClubCodes()
 
         return "Updated: {0} Created: {1}".format(updated, created), 201
 
@@ -3,15 +3,19 @@
 from flask import Blueprint, request, render_template, redirect, url_for, jsonify
 from datetime import datetime
 from losttime import entryfiles
-from ._output_templates import EntryWriter
+from losttime.pdfs import render_pdf, pdf_status, warm_pool
+from losttime.timing import stage
 import re
 import csv
+import json
 from os import remove
 from os.path import join, isfile
 from collections import Counter
 
 entryManager = Blueprint("entryManager", __name__, static_url_path='/download', static_folder='../static/userfiles')
 
+CHECKIN_STYLESHEET = join(entryManager.static_folder, 'CheckInEntries.css')
+
 @entryManager.route('/')
 def home():
     return redirect(url_for('entryManager.upload_entries'))
@@ -32,28 +36,38 @@ def upload_entries():
             filenum = re.search(r'\[\d+\]', k).group().strip('[]')
             filename = 'entry_{0}_{1}.csv'.format(request.form['stamp'], filenum)
             try:
-                infile = entryfiles.save(request.files[k], name=filename)
+                with stage('save'):
+                    infile = entryfiles.save(request.files[k], name=filename)
                 infiles.append(entryfiles.path(infile))
             except:
                 return jsonify(error="Server error: Failed to save file"), 500
 
+        from ._output_templates import EntryWriter
         writer = EntryWriter(infiles, request.form['entry-format'], request.form['entry-type'], request.form['entry-punch'])
+        checkin = request.form['entry-format'] in ['CheckIn', 'CheckInNationalMeet']
+        if checkin:
+            # the sheet html waits here until a pdf worker renders it
+            outfilename, pdffilename = _checkInFiles(request.form['stamp'])
+        else:
+            outfilename = join(entryManager.static_folder, 'EntryForOE-{0}.csv'.format(request.form['stamp']))
         try:
-            doc = writer.writeEntries()
+            # rows are written to the file as they are read
+            with stage('entries'), open(outfilename, 'w') as out:
+                writer.writeEntries(out)
         except:
             for path in infiles:
                 remove(path)
+            if isfile(outfilename):
+                remove(outfilename)
             return jsonify(error="Unable to parse entries from this csv file"), 400
-        if request.form['entry-format'] == 'OE':
-            outfilename = join(entryManager.static_folder, 'EntryForOE-{0}.csv'.format(request.form['stamp']))
-            with open(outfilename, 'w') as out:
-                out.write(doc)
-        elif request.form['entry-format'] in ['CheckIn', 'CheckInNationalMeet']:
-            outfilename = join(entryManager.static_folder, 'EntryForCheckIn-{0}.pdf'.format(request.form['stamp']))
-            from weasyprint import HTML
-            HTML(string=doc).write_pdf(outfilename, stylesheets=[join(entryManager.static_folder,'CheckInEntries.css')])
         for path in infiles:
             remove(path)
+        if checkin:
+            with stage('pdf'):
+                render_pdf(outfilename, pdffilename, CHECKIN_STYLESHEET)
+        else:
+            with stage('stats'), open(_statsFile(request.form['stamp']), 'w') as f:
+                json.dump(_entries_stats(writer.categories), f)
         return jsonify(stamp=request.form['stamp']), 201
 
 @entryManager.route('/entries/<entryid>', methods=['GET'])
@@ -64,28 +78,52 @@ def download_entries(entryid):
     """
     entryfn = 'EntryForOE-{0}.csv'.format(entryid)
     if isfile(join(entryManager.static_folder, entryfn)):
-        stats = _entries_stats_OE(join(entryManager.static_folder, entryfn))
+        try:
+            with open(_statsFile(entryid), 'r') as f:
+                stats = json.load(f)
+        except IOError:
+            # written before stats were saved alongside the entries
+            stats = _entries_stats_OE(join(entryManager.static_folder, entryfn))
         return render_template('entrymanager/download.html', entryfn=entryfn, stats=stats)
 
     entryfn = 'EntryForCheckIn-{0}.pdf'.format(entryid)
-    if isfile(join(entryManager.static_folder, entryfn)):
-        return render_template('entrymanager/download.html', entryfn=entryfn)
+    status = pdf_status(*_checkInFiles(entryid))
+    if status is not None:
+        return render_template('entrymanager/download.html', entryfn=entryfn, entryid=entryid, status=status)
 
     return("Hmm... we didn't find that file"), 404
 
+@entryManager.route('/status/<entryid>', methods=['GET'])
+def entries_status(entryid):
+    """Report whether the check-in sheet pdf for these entries is ready"""
+    status = pdf_status(*_checkInFiles(entryid))
+    if status is None:
+        return jsonify(error='No check-in sheet for entries {0}'.format(entryid)), 404
+    return jsonify(status=status), 200
+
+@entryManager.before_app_first_request
+def _warm_pdf_pool():
+    warm_pool(CHECKIN_STYLESHEET)
+
+def _checkInFiles(entryid):
+    """(html waiting to be rendered, pdf) paths for a check-in sheet"""
+    return (join(entryManager.static_folder, 'EntryForCheckIn-{0}.html'.format(entryid)),
+            join(entryManager.static_folder, 'EntryForCheckIn-{0}.pdf'.format(entryid)))
+
+def _statsFile(entryid):
+    """json stats saved next to EntryForOE-<entryid>.csv"""
+    return join(entryManager.static_folder, 'EntryForOE-{0}.json'.format(entryid))
+
+def _entries_stats(categories):
+    """Download page stats from a Counter of entries per class"""
+    cats = sorted(categories.items(), key=lambda x: x[0])
+
+    if cats and cats[0][0] == '':
+        cats[0] = ('NO CLASS', cats[0][1])
+    return {'count':sum(categories.values()), 'categories':cats}
+
 def _entries_stats_OE(filename):
     with open(filename, 'r') as f:
-        numentries = 0
-        categories = []
-
         reader = csv.reader(f, delimiter=';')
         next(reader) #skip the header line
-        for line in reader:
-            numentries += 1
-            categories.append(line[25])
-
-        cats = sorted(Counter(categories).items(), key=lambda x: x[0])
-
-        if cats[0][0] == '':
-            cats[0] = ('NO CLASS', cats[0][1])
-    return {'count':numentries, 'categories':cats}
+        return _entries_stats(Counter(line[25] for line in reader))
@@ -3,16 +3,26 @@
 from flask import Blueprint, url_for, redirect, request, render_template, jsonify, flash
 import flask_login
 from datetime import datetime
-from losttime import eventfiles
-from losttime.models import db, Event, EventClass, PersonResult, EventTeamClass, TeamResult, ClubCode
+from time import time
+from losttime import app, eventfiles
+from losttime.jobs import job_handler, enqueue_job, latest_job
+from losttime.timing import stage
+from losttime.querycount import query_budget
+from losttime.models import db, Event, EventClass, PersonResult, EventTeamClass, EventTeamClassMember, TeamResult, TeamResultMember, ResultSplits
 from ._orienteer_data import OrienteerResultReader
-from ._output_templates import EventHtmlWriter
+from ._parse_cache import parseCacheKey, parseCacheEnabled, loadParsedEvent, saveParsedEvent
+from ._splits import packSplits, analyzeSplits, eventSplits
+from ._club_codes import getClubCodes
+from ._artifacts import writeArtifact, artifactETag, sendArtifact, renderTagged, pageETag
+from .series_result import update_series_for_replaced_event
 from os import remove
 from os.path import join
 
 
 eventResult = Blueprint("eventResult", __name__, static_url_path='/download', static_folder='../static/userfiles')
 
+BULK_INSERT_BATCH = 1000 # PersonResult rows per executemany
+
 @eventResult.route('/')
 def home():
     return redirect(url_for('eventResult.upload_event'))
@@ -30,11 +40,13 @@ def upload_event():
         return render_template('eventresult/upload.html', replaceid=replace)
 
     elif request.method == 'POST':
+        started = time()
         timestamp = datetime.now().strftime('%Y%m%d%H%M%S')
         filename = 'eventResult_{0}.'.format(timestamp)
         try:
             # filename ending with '.' applies extension to end
-            infile = eventfiles.save(request.files['eventFile'], name=filename)
+            with stage('save'):
+                infile = eventfiles.save(request.files['eventFile'], name=filename)
         except:
             return jsonify(error="Failed to save file, try again later"), 500
 
@@ -44,46 +56,31 @@ def upload_event():
         else:
             isScoreO = False
             event_type = 'standard'
-        reader = OrienteerResultReader(eventfiles.path(infile), isScoreO)
-        if not reader.isValid:
-            remove(eventfiles.path(infile))
-            return jsonify(error='Could not parse results from that file.'), 422
+        # the same file uploaded again is read from the parse cache
+        with stage('cache'):
+            cachekey = parseCacheKey(eventfiles.path(infile), isScoreO)
+            parsed = loadParsedEvent(cachekey)
+        if parsed is None:
+            with stage('parse'):
+                reader = OrienteerResultReader(eventfiles.path(infile), isScoreO, stream=True)
+                if not reader.isValid:
+                    remove(eventfiles.path(infile))
+                    return jsonify(error='Could not parse results from that file.'), 422
+                if parseCacheEnabled():
+                    parsed = (reader.getEventMeta(), list(reader.iterEventClassPersonResults()))
+                    saveParsedEvent(cachekey, *parsed)
+                else:
+                    # classes are read as they are inserted, the file is never held whole
+                    parsed = (reader.getEventMeta(), reader.iterEventClassPersonResults())
 
-        Oevent = reader.getEventMeta()
+        Oevent, classresults = parsed
         ltuser = flask_login.current_user.get_id()
         new_event = Event(Oevent.name, Oevent.date, Oevent.venue, None, event_type, ltuser)
-        db.session.add(new_event)
-        db.session.commit()
-        eventid = new_event.id
-
-        for Oec in reader.getEventClasses():
-            new_ec = EventClass(eventid, Oec.name, Oec.shortname, Oec.scoremethod)
-            db.session.add(new_ec)
-            db.session.commit()
-            classid = new_ec.id
+        with stage('insert'):
+            eventid = _bulkInsertEvent(new_event, classresults, isScoreO)
 
-            for Oepr in reader.getEventClassPersonResults(Oec):
-                if isScoreO:
-                    ScoreO_data = {'points': Oepr.ScoreO_points, 'penalty': Oepr.ScoreO_penalty}
-                else:
-                    ScoreO_data = None
-                new_pr = PersonResult(
-                    eventid,
-                    classid,
-                    Oepr.sicard,
-                    Oepr.name,
-                    Oepr.bib,
-                    Oepr.clubshortname,
-                    Oepr.coursestatus,
-                    Oepr.resultstatus,
-                    Oepr.time,
-                    ScoreO_data
-                )
-                db.session.add(new_pr)
-
-        db.session.commit()
         remove(eventfiles.path(infile))
-        return jsonify(eventid=eventid), 201
+        return jsonify(eventid=eventid, elapsed=round(time() - started, 3)), 201
 
 @eventResult.route('/info/<eventid>', methods=['GET', 'POST'])
 def event_info(eventid):
@@ -101,38 +98,30 @@ def event_info(eventid):
                                replace=replace)
 
     elif request.method == 'POST':
-        event = Event.query.get(eventid)
-        event.name = request.form['event-name']
-        try:
-            event.date = datetime.strptime(request.form['event-date'], "%Y-%m-%d")
-        except:
-            event.data = None
-        event.venue = request.form['event-venue']
-        event.host = request.form['event-host']
-        db.session.add(event)
-
-        classes = EventClass.query.filter_by(eventid=eventid).all()
-        for ec in classes:
-            form_name = 'class-score-method-{0}'.format(ec.id)
-            ec.scoremethod = request.form[form_name]
-            db.session.add(ec)
-        db.session.commit()
-
-        _assignPositions(eventid)
-        _assignScores(eventid)
-        _assignTeamScores(eventid, request.form['event-team-score-method'])
-
-        docdict = _buildResultPages(eventid, request.form['output-style'])
-        for key,doc in docdict.items():
-            filename = join(eventResult.static_folder, 'EventResult-{0:03d}-{1}.html'.format(int(eventid),key))
-            with open(filename, 'w') as f:
-                f.write(doc.render())
+        with stage('update'):
+            event = Event.query.get(eventid)
+            event.name = request.form['event-name']
+            try:
+                event.date = datetime.strptime(request.form['event-date'], "%Y-%m-%d")
+            except:
+                event.data = None
+            event.venue = request.form['event-venue']
+            event.host = request.form['event-host']
+            db.session.add(event)
+
+            classes = EventClass.query.filter_by(eventid=eventid).all()
+            for ec in classes:
+                form_name = 'class-score-method-{0}'.format(ec.id)
+                ec.scoremethod = request.form[form_name]
+                db.session.add(ec)
+            db.session.commit()
 
         replace = request.form['replace'] # string id or 'None'
+        replaceid = None # marked replaced by the job, once this event is processed
         if replace != 'None':
-            replaced = mark_event_as_replaced(replace, event.id)
-            if replaced:
-                flash('Updated event {} with this event result.'.format(replace), 'info')
+            if _mayReplaceEvent(replace, event.id):
+                replaceid = int(replace)
+                flash('Event {} will be updated with this event result once it is processed.'.format(replace), 'info')
             else:
                 flash("Didn't update event {}, something went wrong!".format(replace), 'warning')
 
@@ -151,15 +140,134 @@ def event_info(eventid):
         #     else:
         #         flash("Didn't update event {}, that is not your event!".format(prev.name), 'warning')
 
-        event = Event.query.get(eventid)
-        event.isProcessed = True
-        db.session.add(event)
-        db.session.commit()
+        with stage('enqueue'):
+            enqueue_job('process_event', int(eventid),
+                        teamscoremethod=request.form['event-team-score-method'],
+                        style=request.form['output-style'],
+                        replace=replaceid)
 
         return redirect(url_for('eventResult.event_results', eventid=eventid, replace=replace))
 
 
+@job_handler('process_event')
+def _processEvent(eventid, teamscoremethod, style, replace=None):
+    """Score the event and write its result pages, run by the job pool
+
+    The event replace is marked replaced by this one once it is processed,
+    so a failed job leaves the old event listed.
+    """
+    from ._scoring import scoreEvent
+    with stage('score'):
+        scoreEvent(eventid)
+    with stage('teams'):
+        _assignTeamScores(eventid, teamscoremethod)
+    with stage('splits'):
+        analyzeSplits(eventid)
+
+    with stage('build'):
+        docdict = _buildResultPages(eventid, style)
+    for key,doc in docdict.items():
+        filename = join(eventResult.static_folder, 'EventResult-{0:03d}-{1}.html'.format(int(eventid),key))
+        with stage('render-' + key):
+            text = doc.render()
+        with stage('write-' + key):
+            writeArtifact(filename, text)
+
+    event = Event.query.get(eventid)
+    event.isProcessed = True
+    db.session.add(event)
+    db.session.commit()
+    if replace is not None:
+        _replaceEvent(replace, eventid)
+
+    # series still using an event this one replaced move over now it has scores
+    with stage('series'):
+        for old_event in Event.query.filter_by(replacedbyid=eventid).all():
+            update_series_for_replaced_event(old_event.id, eventid)
+    return
+
+
+def _bulkInsertEvent(new_event, classresults, isScoreO):
+    """Write an event with its classes and results in one transaction
+
+    classresults is an iterable of (EventClass, [EventPersonResult]) from the
+    reader, consumed one class at a time. Each class is inserted to get its
+    id, then results are buffered and inserted in batches of BULK_INSERT_BATCH
+    rows, with their split times packed into ResultSplits rows. Returns the new
+    event id.
+    """
+    db.session.add(new_event)
+    db.session.flush()
+    eventid = new_event.id
+
+    rows = []
+    splits = []
+    for Oec, Oeprs in classresults:
+        classid = db.session.execute(EventClass.__table__.insert(), {
+            'eventid': eventid,
+            'name': Oec.name,
+            'shortname': Oec.shortname,
+            'scoremethod': Oec.scoremethod}).inserted_primary_key[0]
+        for Oepr in Oeprs:
+            splits.append((classid, Oepr.splits, Oepr.time))
+            row = {'eventid': eventid,
+                   'classid': classid,
+                   'sicard': Oepr.sicard,
+                   'name': Oepr.name,
+                   'bib': Oepr.bib,
+                   'club_shortname': Oepr.clubshortname,
+                   'coursestatus': Oepr.coursestatus,
+                   'resultstatus': Oepr.resultstatus,
+                   'time': Oepr.time,
+                   'ScoreO_points': None,
+                   'ScoreO_penalty': None,
+                   'ScoreO_net': None}
+            if isScoreO:
+                row['ScoreO_points'] = Oepr.ScoreO_points
+                row['ScoreO_penalty'] = Oepr.ScoreO_penalty
+                row['ScoreO_net'] = max(Oepr.ScoreO_points - Oepr.ScoreO_penalty, 0)
+            rows.append(row)
+            if len(rows) == BULK_INSERT_BATCH:
+                _insertResults(eventid, rows, splits)
+                rows = []
+                splits = []
+    _insertResults(eventid, rows, splits)
+
+    db.session.commit()
+    return eventid
+
+def _insertResults(eventid, rows, splits):
+    """Insert a batch of PersonResult rows and the ResultSplits for them"""
+    if len(rows) == 0:
+        return
+    db.session.execute(PersonResult.__table__.insert(), rows)
+    if not any(s for classid, s, finish in splits):
+        return
+    # this transaction holds the new event, so its newest results are this batch
+    resultids = [x.id for x in db.session.query(PersonResult.id).filter_by(eventid=eventid).
+                 order_by(PersonResult.id.desc()).limit(len(rows))]
+    splitrows = []
+    for resultid, (classid, s, finish) in zip(reversed(resultids), splits):
+        if s:
+            controls, times = packSplits(s, finish)
+            splitrows.append({'resultid': resultid,
+                              'eventid': eventid,
+                              'classid': classid,
+                              'controls': controls,
+                              'times': times})
+    db.session.execute(ResultSplits.__table__.insert(), splitrows)
+
+
 def mark_event_as_replaced(old_event_id, new_event_id):
+    if not _mayReplaceEvent(old_event_id, new_event_id):
+        return False
+    _replaceEvent(old_event_id, new_event_id)
+    if Event.query.get(new_event_id).isProcessed:
+        update_series_for_replaced_event(old_event_id, new_event_id)
+    return True
+
+def _mayReplaceEvent(old_event_id, new_event_id):
+    """True if the current user owns both events"""
     if old_event_id == 'None' or new_event_id == 'None':
         return False
 
@@ -167,16 +275,18 @@ def mark_event_as_replaced(old_event_id, new_event_id):
     new_event = Event.query.get(new_event_id)
 
     ltuser = flask_login.current_user.get_id()
-    if (ltuser != None) and (int(ltuser) == old_event.ltuserid) and (int(ltuser) == new_event.ltuserid):
-        old_event.replacedbyid = new_event.id
-        db.session.add(old_event)
-        older_events = Event.query.filter_by(replacedbyid=old_event_id).all()
-        for older_event in older_events:
-            older_event.replacedbyid = new_event.id
-            db.session.add(older_event)
-        db.session.commit()
-        return True
-    return False
+    return (ltuser != None) and (int(ltuser) == old_event.ltuserid) and (int(ltuser) == new_event.ltuserid)
+
+def _replaceEvent(old_event_id, new_event_id):
+    """Mark an event, and the events it replaced, replaced by new_event_id"""
+    old_event = Event.query.get(old_event_id)
+    old_event.replacedbyid = int(new_event_id)
+    db.session.add(old_event)
+    older_events = Event.query.filter_by(replacedbyid=old_event_id).all()
+    for older_event in older_events:
+        older_event.replacedbyid = int(new_event_id)
+        db.session.add(older_event)
+    db.session.commit()
 
 
 @eventResult.route('/replace', methods=['POST'])
@@ -192,179 +302,84 @@ def mark_as_replaced():
 
 
 @eventResult.route('/results/<eventid>', methods=['GET'])
+@query_budget(5)
 def event_results(eventid):
     """Display formatted page for download
 
+    Shows a progress page while the event is still being processed.
     """
+    replaceid = request.args.get('replace')
+    job = latest_job('process_event', int(eventid))
+    if job is not None and job.status != 'done':
+        return render_template('eventresult/processing.html',
+                               eventid=eventid,
+                               replaceid=replaceid)
+    indvfn = 'EventResult-{0:03d}-indv.html'.format(int(eventid))
+    teamfn = 'EventResult-{0:03d}-team.html'.format(int(eventid))
+    indvetag = artifactETag(join(eventResult.static_folder, indvfn))
+    if indvetag is None:
+        return "It seems that there are no event results files for event {0}".format(eventid), 404
+    etag = pageETag(indvetag, artifactETag(join(eventResult.static_folder, teamfn)),
+                    eventid, replaceid, flask_login.current_user.get_id())
+    return renderTagged(etag, lambda: _renderEventResults(eventid, indvfn, teamfn, replaceid))
+
+def _renderEventResults(eventid, indvfn, teamfn, replaceid):
     try:
-        indvfn = 'EventResult-{0:03d}-indv.html'.format(int(eventid))
         filepath = join(eventResult.static_folder, indvfn)
         with open(filepath) as f:
             indvhtmldoc = f.read()
     except IOError:
         return "It seems that there are no event results files for event {0}".format(eventid), 404
     try:
-        teamfn = 'EventResult-{0:03d}-team.html'.format(int(eventid))
         filepath = join(eventResult.static_folder, teamfn)
         with open(filepath) as f:
             teamhtmldoc = f.read().decode('utf-8')
     except:
         teamfn = None
         teamhtmldoc = None
-    replaceid = request.args.get('replace')
+    hassplits = db.session.query(ResultSplits.resultid).filter_by(eventid=eventid).first() is not None
     return render_template('eventresult/result.html', 
                            eventid=eventid, 
                            indvhtml=indvhtmldoc, 
                            indvfn=indvfn, 
                            teamhtml=teamhtmldoc, 
                            teamfn=teamfn,
-                           replaceid=replaceid)
+                           replaceid=replaceid,
+                           hassplits=hassplits)
 
-def _assignPositions(eventid):
-    """Assign position to PersonResult.position
+@eventResult.route('/splits/<eventid>', methods=['GET'])
+@query_budget(5)
+def event_splits(eventid):
+    """Split times with places on each leg and estimated time lost
 
-    Given an eventid, queries for associated PersonResults, computes and assigns position.
-    Ties are awarded the same place, with the following finisher bumped an extra place down.
-    For example the first 5 places, including a tie for 2nd, are: 1, 2, 2, 4, 5.
-    Positions only assigned for 'time', 'worldcup', and '1000pts' scoremethods, others skipped.
-    Invalid results are assigned a place of -1.
+    Everything shown was computed when the event was processed.
     """
-    classes = EventClass.query.filter_by(eventid=eventid).all()
-    for ec in classes:
-        with db.session.no_autoflush:
-            ec_results = PersonResult.query.filter_by(eventid=eventid).filter_by(classid=ec.id).all()
-            if len(ec_results) == 0:
-                # TODO log event class with no results.
-                continue
-
-            if ec.scoremethod in ['time', 'worldcup', '1000pts']:
-                done = []
-                to_assign = []
-                for ec_result in ec_results:
-                    if ec_result.coursestatus != 'ok' or ec_result.resultstatus != 'ok':
-                        ec_result.position = -1
-                        done.append(ec_result)
-                    else:
-                        to_assign.append(ec_result)
-
-                to_assign.sort(key=lambda x: x.time)
-                prev_result = (0, 1, -1) # (position, results in current position, time)
-                for i in range(len(to_assign)):
-                    to_assign[i].position = prev_result[0] + prev_result[1] # assign first place
-                    if to_assign[i].time == prev_result[2]:
-                        to_assign[i].position = prev_result[0]
-                        prev_result = (to_assign[i].position, prev_result[1]+1, to_assign[i].time)
-                    else:
-                        prev_result = (to_assign[i].position, 1, to_assign[i].time)
-                db.session.add_all(ec_results)
-                db.session.commit()
-                db.session.flush()
-
-            elif ec.scoremethod in ['score', 'score1000']:
-                ec_results.sort(key=lambda x: x.time) #secondary key
-                ec_results.sort(key=lambda x: x.ScoreO_net, reverse=True) #primary key
-                prev_result = (0, 1, -1, -1) # (position, results in current position, time, score)
-                for i in range(len(ec_results)):
-                    if ec_results[i].coursestatus != 'ok' or ec_results[i].resultstatus != 'ok':
-                        ec_results[i].position = -1
-                        continue
-                    ec_results[i].position = prev_result[0] + prev_result[1]
-                    if ec_results[i].time == prev_result[2] and ec_results[i].ScoreO_net == prev_result[3]:
-                        ec_results[i].position = prev_result[0]
-                        prev_result = (ec_results[i].position, prev_result[1]+1, ec_results[i].time, ec_results[i].ScoreO_net)
-                    else:
-                        prev_result = (ec_results[i].position, 1, ec_results[i].time, ec_results[i].ScoreO_net)
-
-            elif ec.scoremethod in ['alpha', 'hide']:
-                continue
-            else:
-                # TODO log unknown score method
-                continue
-            
-    # db.session.commit()
-    return
-
-def _assignScores(eventid):
-    """Assign values to PersonResult.score
-
-    Given an eventid, queries for associated PersonResults, computes and assigns scores.
-    PersonResults must already be assigned positions, including correct allocation of ties.
-    Recognized scoring methods (read from EventClass.scoremethod) are:
-        'worldcup': 100, 95, 92, 90, 89, 88, 87, ...
-        '1000pts': round ( (winning time / competitor time) * 1000 )
-        'time': duplicates the time to the score column (integer seconds)
-        'hide', 'alpha' or '' will skip
-        anything else will log a warning and skip
-    """
-    classes = EventClass.query.filter_by(eventid=eventid).all()
-    for ec in classes:
-        if ec.scoremethod == 'worldcup':
-            results = PersonResult.query.filter_by(eventid=eventid).filter_by(classid=ec.id).all()
-            for r in results:
-                if not r.position:
-                    # TODO log position not assigned
-                    continue
-                elif (r.position == -1) or (r.position >= 94):
-                    if r.resultstatus == 'nc':
-                        r.score = None
-                    else:                   
-                        r.score = 0
-                elif r.position == 1:
-                    r.score = 100
-                elif r.position == 2:
-                    r.score = 95
-                elif r.position == 3:
-                    r.score = 92
-                else:
-                    r.score = 100 - 6 - int(r.position)
-            db.session.add_all(results)
-        elif ec.scoremethod == '1000pts':
-            results = PersonResult.query.filter_by(eventid=eventid).filter_by(classid=ec.id).all()
-            win_time = next((x.time for x in results if x.position == 1), 0)
-            for r in results:
-                if r.position > 0:
-                    r.score = round((float(win_time) / r.time) * 1000)
-                else:
-                    r.score = 0
-            db.session.add_all(results)
-        elif ec.scoremethod == 'time':
-            results = PersonResult.query.filter_by(eventid=eventid).filter_by(classid=ec.id).all()
-            for r in results:
-                if r.position > 0:
-                    r.score = r.time
-                else:
-                    r.score = 0
-            db.session.add_all(results)
-        elif ec.scoremethod == 'score':
-            results = PersonResult.query.filter_by(eventid=eventid).filter_by(classid=ec.id).all()
-            for r in results:
-                if r.position > 0:
-                    r.score = r.ScoreO_net
-                else:
-                    r.score = 0
-        elif ec.scoremethod == 'score1000':
-            results = PersonResult.query.filter_by(eventid=eventid).filter_by(classid=ec.id).all()
-            win_time, win_score = next(((x.time, x.ScoreO_net) for x in results if x.position == 1), 0)
-            print(win_time, win_score)
-            for r in results:
-                if r.ScoreO_net == win_score:
-                    r.score = round((float(win_time) / r.time) * 1000)
-            slowestSweepScore = min([x.score for x in results if x.score > 0])
-            for r in results:
-                if r.score != None:
-                    continue
-                if r.position > 0:
-                    r.score = round((r.ScoreO_net / float(win_score)) * slowestSweepScore)
-                else:
-                    r.score = 0
-
-        elif ec.scoremethod in ['', 'hide', 'alpha']:
-            continue
-        else:
-            # TODO log an unknown score method
-            continue
-    db.session.commit()
-    return
+    job = latest_job('process_event', int(eventid))
+    if job is not None and job.status != 'done':
+        return render_template('eventresult/processing.html', eventid=eventid, replaceid=None)
+    if job is None:
+        return "It seems that there are no split times for event {0}".format(eventid), 404
+    etag = pageETag('splits', eventid, job.finished)
+    return renderTagged(etag, lambda: _renderEventSplits(eventid))
+
+def _renderEventSplits(eventid):
+    tables = eventSplits(eventid)
+    if len(tables) == 0:
+        return "It seems that there are no split times for event {0}".format(eventid), 404
+    return render_template('eventresult/splits.html', event=Event.query.get(eventid), tables=tables)
+
+@eventResult.route('/download/EventResult-<eventid>-<kind>.html', methods=['GET'])
+def event_result_file(eventid, kind):
+    """Send a result page file, compressed if the client accepts it"""
+    return sendArtifact(join(eventResult.static_folder, 'EventResult-{0}-{1}.html'.format(eventid, kind)))
+
+@eventResult.route('/status/<eventid>', methods=['GET'])
+def event_status(eventid):
+    """Report progress of the latest processing job for this event"""
+    job = latest_job('process_event', int(eventid))
+    if job is None:
+        return jsonify(error='No processing job for event {0}'.format(eventid)), 404
+    return jsonify(job.serialize()), 200
 
 def _assignTeamScores(eventid, scoremethod):
     """Calculate and assign values to TeamResult.score and TeamResult.position
@@ -380,9 +395,12 @@ def _assignTeamScores(eventid, scoremethod):
     if scoremethod in ['none']:
         return
     elif scoremethod == 'wiol':
+        EventTeamClassMember.query.filter(EventTeamClassMember.teamclassid.in_(
+            db.session.query(EventTeamClass.id).filter_by(eventid=eventid))).delete(synchronize_session=False)
+        TeamResultMember.query.filter(TeamResultMember.teamresultid.in_(
+            db.session.query(TeamResult.id).filter_by(eventid=eventid))).delete(synchronize_session=False)
         EventTeamClass.query.filter_by(eventid=eventid).delete()
         TeamResult.query.filter_by(eventid=eventid).delete()
-        db.session.commit()
 
         teamclasses = {}
         classes = EventClass.query.filter_by(eventid=eventid).all()
@@ -405,18 +423,26 @@ def _assignTeamScores(eventid, scoremethod):
             else:
                 pass
         if len(teamclasses.keys()) == 0:
+            db.session.commit()
             return
+        new_tcs = []
         for k, v in teamclasses.items():
-            new_tc = EventTeamClass(eventid, k, v[0], v[1], 'wiol')
-            db.session.add(new_tc)
-        db.session.commit()
+            new_tcs.append((EventTeamClass(eventid, k, v[0], 'wiol'), v[1]))
+        db.session.add_all([tc for tc, ecids in new_tcs])
+        db.session.flush()
+        db.session.add_all([EventTeamClassMember(tc.id, ecid) for tc, ecids in new_tcs for ecid in ecids])
+
+        # every member score comes from this one query
+        classresults = {}
+        for r in PersonResult.query.filter_by(eventid=eventid).all():
+            classresults.setdefault(r.classid, []).append(r)
 
-        teamclasses = EventTeamClass.query.filter_by(eventid=eventid).all()
-        for tc in teamclasses:
+        for tc, ecids in new_tcs:
             results = []
-            for ec in tc.classids.split(','):
-                results += PersonResult.query.filter_by(classid=int(ec)).all()
+            for ec in ecids:
+                results += classresults.get(ec, [])
             teams = set([r.club_shortname for r in results])
+            rankedteams = []
             for team in teams:
                 if team in ['None', 'NONE', 'none']:
                     print("not a team: {}".format(team))
@@ -431,72 +457,23 @@ def _assignTeamScores(eventid, scoremethod):
                 members = members[:3]
                 memberids = [m.id for m in members if m.score > 0]
                 teamscore = sum([m.score for m in members])
-                new_team = TeamResult(eventid, tc.id, team, memberids, teamscore, numstarts, numfinishes)
-                db.session.add(new_team)
-            db.session.commit()
-
-            teamresults = TeamResult.query.filter_by(teamclassid=tc.id).all()
-            teamresults.sort(key=lambda x: -x.score)
-            prev_result = {'pos':0, 'count':1, 'score':0}
-            for i in range(len(teamresults)):
-                teamresults[i].position = prev_result['pos'] + prev_result['count']
-                if teamresults[i].score == prev_result['score']:
-                    pos_tie = False
-                    pos_swap = False
-                    A_memberids = teamresults[i-1].resultids.split(',')
-                    B_memberids = teamresults[i].resultids.split(',')
-                    if A_memberids == [u'']:
-                        A_memberids = []
-                    if B_memberids == [u'']:
-                        B_memberids = []
-
-                    while A_memberids and B_memberids:
-                        A_score = PersonResult.query.get(A_memberids.pop(0)).score
-                        B_score = PersonResult.query.get(B_memberids.pop(0)).score
-                        if A_score > B_score:
-                            # A member n beat B member n, team position correct, not tied
-                            break
-                        elif B_score > A_score:
-                            # B member n beat A member n, team positions swap, not tied
-                            pos_swap = True
-                            break
-                        else:
-                            continue
-                    else:
-                        if A_memberids:
-                            # A has more members, team position correct, not tied
-                            break
-                        elif B_memberids:
-                            # B has more members, team positions swap, not tied
-                            pos_swap = True
-                            break
-                        else:
-                            pos_tie = True
-
-                    if pos_tie:
-                        teamresults[i].position = prev_result['pos']
-                        prev_result = {'pos': prev_result['pos'],
-                                       'count': prev_result['count'] + 1,
-                                       'score': teamresults[i].score}
-                        continue
-                    elif pos_swap:
-                        teamresults[i].position = teamresults[i-1].position
-                        teamresults[i-1].position = prev_result['pos'] + prev_result['count']
-                        prev_result = {'pos': teamresults[i-1].position,
-                                       'count': 1,
-                                       'score': teamresults[i-1].score}
-                        continue
-                    else:
-                        prev_result = {'pos': teamresults[i].position,
-                                       'count': 1,
-                                       'score': teamresults[i].score}
-                        continue
+                new_team = TeamResult(eventid, tc.id, team, teamscore, numstarts, numfinishes)
+                # team score, then individual scores 1 through 3. A team with
+                # more scoring members wins when the others are all equal.
+                tiebreak = (teamscore, tuple([m.score for m in members if m.score > 0]))
+                rankedteams.append((tiebreak, new_team, memberids))
+
+            rankedteams.sort(key=lambda x: x[0], reverse=True)
+            for i in range(len(rankedteams)):
+                if i > 0 and rankedteams[i][0] == rankedteams[i-1][0]:
+                    rankedteams[i][1].position = rankedteams[i-1][1].position
                 else:
-                    prev_result = {'pos': teamresults[i].position,
-                                   'count': 1,
-                                   'score': teamresults[i].score}
-
-            db.session.add_all(teamresults)
+                    rankedteams[i][1].position = i + 1
+            db.session.add_all([x[1] for x in rankedteams])
+            db.session.flush()
+            db.session.add_all([TeamResultMember(team.id, memberid, i)
+                                for tiebreak, team, memberids in rankedteams
+                                for i, memberid in enumerate(memberids)])
         db.session.commit()
         return
 
@@ -512,14 +489,19 @@ def _buildResultPages(eventid, style):
     results = PersonResult.query.filter_by(eventid=eventid).all()
     teamclasses = EventTeamClass.query.filter_by(eventid=eventid).all()
     teamresults = TeamResult.query.filter_by(eventid=eventid).all()
-    clubcodes = {}
-    for club in ClubCode.query.all():
-        clubcodes.setdefault(club.code, []).append(club)
-
-    writer = EventHtmlWriter(event, style, classes, results, teamclasses, teamresults, clubcodes)
+    teammembers = {}
+    for m in TeamResultMember.query.join(TeamResult, TeamResult.id == TeamResultMember.teamresultid). \
+                     filter(TeamResult.eventid == eventid). \
+                     order_by(TeamResultMember.ordinal):
+        teammembers.setdefault(m.teamresultid, []).append(m.resultid)
+    clubcodes = getClubCodes()
+
+    from ._output_templates import EventHtmlWriter
+    writer = EventHtmlWriter(event, style, classes, results, teamclasses, teamresults, clubcodes, teammembers)
+    renderer = app.config.get('HTML_RENDERER', 'dominate')
     docdict = {}
-    docdict['indv'] = writer.eventResultIndv()
-    teamdoc = writer.eventResultTeam()
+    docdict['indv'] = writer.eventResultIndv(renderer)
+    teamdoc = writer.eventResultTeam(renderer)
     if teamdoc: # false if no team results page
         docdict['team'] = teamdoc
     return docdict
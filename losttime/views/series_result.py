@@ -2,16 +2,25 @@
 
 from flask import Blueprint, url_for, redirect, request, render_template, jsonify, flash
 import flask_login
-from losttime.models import db, Event, EventClass, PersonResult, EventTeamClass, TeamResult, Series, SeriesClass, ClubCode
-from ._output_templates import SeriesHtmlWriter
-from os.path import join
-from fuzzywuzzy import fuzz
-import itertools, unicodedata
+from sqlalchemy import or_
+from losttime import app
+from losttime.timing import stage
+from losttime.querycount import query_budget
+from losttime.models import db, Event, EventClass, PersonResult, EventTeamClass, TeamResult, Series, SeriesEvent, SeriesClass, SeriesClassMember, SeriesStanding
+from ._club_codes import getClubCodes
+from ._artifacts import writeArtifact, artifactETag, sendArtifact, renderTagged, pageETag
+from os.path import join, isfile
+import json, math, unicodedata
+from collections import Counter, namedtuple
 from datetime import datetime
 
 
 seriesResult = Blueprint("seriesResult", __name__, static_url_path='/download', static_folder='../static/userfiles')
 
+DUPLICATE_NAME_RATIO = 70 # fuzz.ratio above this flags a possible duplicate. needs tuning. 70 to 80 seems about right.
+
+EventScore = namedtuple('EventScore', ['score', 'position']) # a series event result as saved on a standing
+
 @seriesResult.route('/')
 def home():
     return redirect(url_for('seriesResult.select_events'))
@@ -37,8 +46,10 @@ def select_events():
         if len(events) == 0:
             flash('Add events before creating a series', 'warning')
             return 'Failed to create series: no events', 400
-        series = Series(events, ltuser)
+        series = Series(ltuser)
         db.session.add(series)
+        db.session.flush()
+        db.session.add_all([SeriesEvent(series.id, eventid, i) for i, eventid in enumerate(events)])
         db.session.commit()
 
         return jsonify(seriesid=series.id), 202
@@ -46,8 +57,7 @@ def select_events():
 @seriesResult.route('/getEvents', methods=['GET'])
 def get_series_events():
     serieskey = request.args.get('serieskey')
-    my_series = Series.query.get(serieskey)
-    events = my_series.eventids.split(',')
+    events = _getSeriesEventIds(serieskey)
     return jsonify(events), 200
 
 @seriesResult.route('/info/<seriesid>', methods=['GET', 'POST'])
@@ -55,7 +65,7 @@ def series_info(seriesid):
     if request.method == 'GET':
         replace = Series.query.get(request.args.get('replace'))
         series = Series.query.get(seriesid)
-        eventids = [int(x) for x in series.eventids.split(',')] # TODO handle empty case?
+        eventids = _getSeriesEventIds(seriesid) # TODO handle empty case?
         events = Event.query.filter(Event.id.in_(eventids)).all()
         events.sort(key=lambda x: eventids.index(x.id))
         eventclasses = EventClass.query.filter(EventClass.eventid.in_(eventids)).all()
@@ -78,13 +88,14 @@ def series_info(seriesid):
         oldIndvECs = []
         oldTeamECs= []
         if replace != None:
-            oldSeriesClasses = SeriesClass.query.filter(SeriesClass.seriesid == replace.id).all()
-            for oSC in oldSeriesClasses:
-                oldecids = [int(x) for x in oSC.eventclassids.split(',')]
-                if oSC.classtype == 'indv':
-                    oldIndvECs.extend(oldecids)
-                elif oSC.classtype == 'team':
-                    oldTeamECs.extend(oldecids)
+            oldSeriesClassMembers = db.session.query(SeriesClass.classtype, SeriesClassMember.classid). \
+                                        join(SeriesClassMember, SeriesClassMember.seriesclassid == SeriesClass.id). \
+                                        filter(SeriesClass.seriesid == replace.id).all()
+            for classtype, oldecid in oldSeriesClassMembers:
+                if classtype == 'indv':
+                    oldIndvECs.append(oldecid)
+                elif classtype == 'team':
+                    oldTeamECs.append(oldecid)
 
         verifyScoringMethods(seriesclasses + seriesteamclasses)
 
@@ -99,42 +110,38 @@ def series_info(seriesid):
 
     elif request.method == 'POST':
         formdata = request.get_json(force=True)
-        series = Series.query.get(seriesid)
-        series.name = str(formdata['name'])
-        series.host = str(formdata['host'])
-        series.scoremethod = str(formdata['scoremethod'])
-        series.scoreeventscount = int(formdata['scoreeventscount'])
-        series.scoreeventsneeded = int(formdata['scoreeventsneeded'])
-        series.scoretiebreak = str(formdata['scoretiebreak'])
-        db.session.add(series)
-        db.session.commit()
-
-        # delete seriesClass objects with this seriesid
-        SeriesClass.query.filter_by(seriesid=series.id).delete()
-
-        for c in formdata['classes']:
-            if len(c['eventclasses']) == 0:
-                continue
-            name, abbr = c['name'].rsplit('(', 1)
-            sc = SeriesClass(series.id, name.strip(), abbr.split(')')[0], series.eventids, c['eventclasses'], c['type'])
-            db.session.add(sc)
-        db.session.commit()
+        with stage('update'):
+            series = Series.query.get(seriesid)
+            series.name = str(formdata['name'])
+            series.host = str(formdata['host'])
+            series.scoremethod = str(formdata['scoremethod'])
+            series.scoreeventscount = int(formdata['scoreeventscount'])
+            series.scoreeventsneeded = int(formdata['scoreeventsneeded'])
+            series.scoretiebreak = str(formdata['scoretiebreak'])
+            series.outputformat = str(formdata['output'])
+            db.session.add(series)
+            db.session.commit()
+
+        with stage('classes'):
+            # delete seriesClass objects with this seriesid
+            SeriesClassMember.query.filter(SeriesClassMember.seriesclassid.in_(
+                db.session.query(SeriesClass.id).filter_by(seriesid=series.id))).delete(synchronize_session=False)
+            SeriesClass.query.filter_by(seriesid=series.id).delete()
+
+            for c in formdata['classes']:
+                if len(c['eventclasses']) == 0:
+                    continue
+                name, abbr = c['name'].rsplit('(', 1)
+                sc = SeriesClass(series.id, name.strip(), abbr.split(')')[0], c['type'])
+                db.session.add(sc)
+                db.session.flush()
+                db.session.add_all([SeriesClassMember(sc.id, ecid) for ecid in set(int(x) for x in c['eventclasses'])])
+            db.session.commit()
 
         #create and calculate the series scores
-        seriesresults = _calculateSeries(series.id)
-
-        seriesclasses = SeriesClass.query.filter_by(seriesid=series.id).all()
-        # scdict = {sc.shortname: sc for sc in seriesclasses}
-
-        clubcodes = {}
-        for club in ClubCode.query.all():
-            clubcodes.setdefault(club.code, []).append(club)
-
-        writer = SeriesHtmlWriter(series, formdata['output'], seriesclasses, seriesresults, clubcodes)
-        doc = writer.seriesResult()
-        filename = join(seriesResult.static_folder, 'SeriesResult-{0:03d}.html'.format(int(seriesid)))
-        with open(filename, 'w') as f:
-            f.write(doc.render())
+        with stage('calculate'):
+            seriesresults = _calculateSeries(series.id)
+        _writeSeriesPage(series, series.outputformat, seriesresults)
 
         replace = request.args.get('replace') # empty string or a string id
 
@@ -206,9 +213,17 @@ def replace_series():
     return redirect(url_for('users.user_home')), 200
 
 @seriesResult.route('/results/<seriesid>', methods=['GET'])
+@query_budget(4)
 def series_result(seriesid):
+    fn = 'SeriesResult-{0:03d}.html'.format(int(seriesid))
+    fileetag = artifactETag(join(seriesResult.static_folder, fn))
+    if fileetag is None:
+        return "couldn't find that file...", 404
+    etag = pageETag(fileetag, seriesid, flask_login.current_user.get_id())
+    return renderTagged(etag, lambda: _renderSeriesResult(seriesid, fn))
+
+def _renderSeriesResult(seriesid, fn):
     try:
-        fn = 'SeriesResult-{0:03d}.html'.format(int(seriesid))
         filepath = join(seriesResult.static_folder, fn)
         with open(filepath, encoding='utf-8') as f:
             htmldoc = f.read()
@@ -216,41 +231,99 @@ def series_result(seriesid):
         return "couldn't find that file...", 404
     return render_template('seriesresult/result.html', seriesid=seriesid, thehtml=htmldoc, fn=fn)
 
+@seriesResult.route('/download/SeriesResult-<seriesid>.html', methods=['GET'])
+def series_result_file(seriesid):
+    """Send a series page file, compressed if the client accepts it"""
+    return sendArtifact(join(seriesResult.static_folder, 'SeriesResult-{0}.html'.format(seriesid)))
+
+
+def _getSeriesEventIds(seriesid):
+    """Event ids in a series, in series order"""
+    return [x.eventid for x in SeriesEvent.query.filter_by(seriesid=seriesid).order_by(SeriesEvent.ordinal)]
+
+def _writeSeriesPage(series, format, seriesresults):
+    with stage('build'):
+        seriesclasses = SeriesClass.query.filter_by(seriesid=series.id).all()
+
+        clubcodes = getClubCodes()
+
+        from ._output_templates import SeriesHtmlWriter
+        writer = SeriesHtmlWriter(series, format, seriesclasses, seriesresults, clubcodes, _getSeriesEventIds(series.id))
+        doc = writer.seriesResult(app.config.get('HTML_RENDERER', 'dominate'))
+    with stage('render'):
+        text = doc.render()
+    with stage('write'):
+        writeArtifact(_seriesPageFile(series.id), text)
+
+def _seriesPageFile(seriesid):
+    return join(seriesResult.static_folder, 'SeriesResult-{0:03d}.html'.format(int(seriesid)))
+
+def _competitorKey(sc, r):
+    """Key matching a competitor's results across the events of a series class"""
+    if sc.classtype == 'indv':
+        ascii_name = unicodedata.normalize('NFKD', r.name.upper()).encode('ascii', 'ignore')
+        return '{0}-{1}'.format(ascii_name, r.club_shortname)
+    return r.teamname_short
+
+def _seriesClassEntries(sc, eventids, clubs=None):
+    """
+    Results in a series class by competitor, as {competitor key: {'key',
+    'name', 'club', 'results': {eventid: result or False}}}. clubs limits
+    individual results to those clubs, and team results to those teams.
+    """
+    entries = {}
+    if sc.classtype == 'indv':
+        query = PersonResult.query. \
+                    join(SeriesClassMember, SeriesClassMember.classid == PersonResult.classid). \
+                    filter(SeriesClassMember.seriesclassid == sc.id)
+        if clubs is not None:
+            query = query.filter(_inClubs(PersonResult.club_shortname, clubs))
+        for r in query.all():
+            if r.resultstatus == 'nc':
+                continue
+            key = _competitorKey(sc, r)
+            defaultdict = {'key':key, 'name':r.name, 'club':r.club_shortname, 'results':{x:False for x in eventids}}
+            entries.setdefault(key, defaultdict)['results'][r.eventid] = r
+    elif sc.classtype == 'team':
+        query = TeamResult.query. \
+                    join(SeriesClassMember, SeriesClassMember.classid == TeamResult.teamclassid). \
+                    filter(SeriesClassMember.seriesclassid == sc.id)
+        if clubs is not None:
+            query = query.filter(_inClubs(TeamResult.teamname_short, clubs))
+        for r in query.all():
+            key = _competitorKey(sc, r)
+            defaultdict = {'key':key, 'name':r.teamname_short, 'results':{x:False for x in eventids}}
+            entries.setdefault(key, defaultdict)['results'][r.eventid] = r
+    else:
+        raise "Didn't find any results"
+    return entries
+
+def _inClubs(column, clubs):
+    """Filter for column in clubs, a None club matches runners without one"""
+    named = [x for x in clubs if x is not None]
+    if None in clubs:
+        return or_(column.in_(named), column.is_(None))
+    return column.in_(named)
 
 def _calculateSeries(seriesid):
+    """Score every series class from scratch and save the standings
+
+    The standings are flushed, not committed, so the results returned stay
+    loaded for the page writer. The caller commits.
+    """
     series = Series.query.get(seriesid)
-    eventids = [int(x) for x in series.eventids.split(',')]
+    eventids = _getSeriesEventIds(seriesid)
     seriesclasses = SeriesClass.query.filter_by(seriesid=seriesid).all()
+    SeriesStanding.query.filter_by(seriesid=seriesid).delete()
     seriesresults = {}
     for sc in seriesclasses:
-        ecids = [int(x) for x in sc.eventclassids.split(',')]
-        scresultdict = {}
-        if sc.classtype == 'indv':
-            results = PersonResult.query.filter(PersonResult.classid.in_(ecids)).all()
-            for r in results:
-                if r.resultstatus == 'nc':
-                    continue
-                defaultdict = {'name':r.name, 'club':r.club_shortname, 'results':{x:False for x in eventids}}
-                ascii_name = unicodedata.normalize('NFKD', r.name.upper()).encode('ascii', 'ignore')
-                seriesresultkey = '{0}-{1}'.format(ascii_name, r.club_shortname)
-                scresultdict.setdefault(seriesresultkey, defaultdict)['results'][r.eventid] = r
-        elif sc.classtype == 'team':
-            results = TeamResult.query.filter(TeamResult.teamclassid.in_(ecids)).all()
-            for r in results:
-                defaultdict = {'name':r.teamname_short, 'results':{x:False for x in eventids}}
-                scresultdict.setdefault(r.teamname_short, defaultdict)['results'][r.eventid] = r
-        else:
-            raise "Didn't find any results"
+        scresultdict = _seriesClassEntries(sc, eventids)
 
         # Check to see if any entires in scresultdict might need to be combined
         possible_dupes = [(k,v) for k, v in scresultdict.items() if False in scresultdict[k]['results'].values()]
 
-        name_matches = []
-        for r1, r2 in itertools.combinations(possible_dupes, 2):
-            ratio1 = fuzz.ratio(r1[1]['name'], r2[1]['name'])
-            if ratio1 > 70: # needs tuning. 70 to 80 seems about right.
-                # print r1[1]['name'], r2[1]['name'], ratio1
-                name_matches.append((r1, r2))
+        name_matches = [(possible_dupes[i], possible_dupes[j])
+                        for i, j in _similarNames([v['name'] for k, v in possible_dupes])]
 
         event_matches = []
         for m1, m2 in name_matches:
@@ -268,12 +341,246 @@ def _calculateSeries(seriesid):
             sr['score'], sr['scores'] = _calculateSeriesScore(series, sr['results'].values())
 
         scresults = _assignSeriesClassPositions(series, [x for x in scresultdict.values() if x['score'] is not None])
-        scresults.sort(key=lambda x: x['position'])
+        scresults.sort(key=lambda x: (x['position'], x['key']))
         seriesresults[sc.shortname] = scresults
+
+        standings = []
+        for sr in scresults:
+            standing = SeriesStanding(seriesid, sc.id, sr['key'], sr['name'], sr.get('club'))
+            _setStanding(standing, sr)
+            standings.append(standing)
+        db.session.add_all(standings)
+    db.session.flush()
     return seriesresults
 
+def _setStanding(standing, sr):
+    """Copy a series result's score, tiebreak and position to its standing"""
+    standing.score = sr['score'] if sr['score'] is not False else None
+    standing.tiebreak = json.dumps(sr['scores']) if sr['scores'] is not False else None
+    standing.position = sr.get('position')
+    standing.results = json.dumps({eid: [r.score, r.position] for eid, r in sr['results'].items() if r is not False})
+
+def update_series_for_replaced_event(old_event_id, new_event_id):
+    """
+    Move the series using an event to the event replacing it, matching
+    classes by short name. Only the standings of competitors with results
+    in the old or new event are recomputed, from those results and the
+    event results saved on their standings, then the class is re-ranked and
+    the series page rewritten from the saved standings, in the format it
+    was made with. A series without a page keeps not having one.
+    """
+    old_event_id, new_event_id = int(old_event_id), int(new_event_id)
+    seriesevents = SeriesEvent.query. \
+                       join(Series, Series.id == SeriesEvent.seriesid). \
+                       filter(SeriesEvent.eventid == old_event_id). \
+                       filter(Series.replacedbyid == None).all()
+    if len(seriesevents) == 0:
+        return
+    oldclasses = {'indv': {ec.id: ec.shortname for ec in EventClass.query.filter_by(eventid=old_event_id)},
+                  'team': {tc.id: tc.shortname for tc in EventTeamClass.query.filter_by(eventid=old_event_id)}}
+    newclasses = {'indv': {ec.shortname: ec.id for ec in EventClass.query.filter_by(eventid=new_event_id)},
+                  'team': {tc.shortname: tc.id for tc in EventTeamClass.query.filter_by(eventid=new_event_id)}}
+
+    for se in seriesevents:
+        series = Series.query.get(se.seriesid)
+        if SeriesEvent.query.filter_by(seriesid=series.id, eventid=new_event_id).count() == 0:
+            db.session.add(SeriesEvent(series.id, new_event_id, se.ordinal))
+        db.session.delete(se)
+        db.session.flush()
+        eventids = _getSeriesEventIds(series.id)
+        writepage = series.outputformat is not None and isfile(_seriesPageFile(series.id))
+
+        seriesresults = {}
+        for sc in SeriesClass.query.filter_by(seriesid=series.id).all():
+            standings = None
+            oldmap = oldclasses.get(sc.classtype, {})
+            members = [m.classid for m in SeriesClassMember.query.filter_by(seriesclassid=sc.id)]
+            oldids = [x for x in members if x in oldmap]
+            if len(oldids) > 0:
+                # a replacement already in the series has its classes in already
+                newids = set(newclasses[sc.classtype][oldmap[x]] for x in oldids if oldmap[x] in newclasses[sc.classtype])
+                newids -= set(members)
+                SeriesClassMember.query.filter_by(seriesclassid=sc.id). \
+                    filter(SeriesClassMember.classid.in_(oldids)).delete(synchronize_session=False)
+                db.session.add_all([SeriesClassMember(sc.id, x) for x in newids])
+                db.session.flush()
+                # just the columns standings need, loading whole results is most of the work
+                if sc.classtype == 'indv':
+                    changed = db.session.query(PersonResult.eventid, PersonResult.name, PersonResult.club_shortname,
+                                               PersonResult.resultstatus, PersonResult.score, PersonResult.position). \
+                                  filter(PersonResult.classid.in_(oldids + list(newids))).all()
+                else:
+                    changed = db.session.query(TeamResult.eventid, TeamResult.teamname_short, TeamResult.score, TeamResult.position). \
+                                  filter(TeamResult.teamclassid.in_(oldids + list(newids))).all()
+                standings = _updateStandings(series, sc, eventids, changed)
+            if writepage:
+                seriesresults[sc.shortname] = _seriesClassStandings(sc, eventids, standings)
+        db.session.commit()
+        if writepage:
+            _writeSeriesPage(series, series.outputformat, seriesresults)
+    return
+
+def _updateStandings(series, sc, eventids, changed):
+    """Recompute the standings of the competitors with these results and re-rank the class
+
+    Their results in the other series events are the ones saved on their
+    standings, so only the changed results are read. Returns the class's
+    standings.
+    """
+    standings = {st.competitor: st for st in SeriesStanding.query.filter_by(seriesclassid=sc.id)}
+    competitors = {}
+    for r in changed:
+        competitors.setdefault(_competitorKey(sc, r), []).append(r)
+    if any(standings[key].results is None for key in competitors if key in standings):
+        # saved before standings kept their event results
+        clubs = set(r.club_shortname if sc.classtype == 'indv' else r.teamname_short for r in changed)
+        entries = _seriesClassEntries(sc, eventids, clubs)
+    else:
+        entries = _changedEntries(sc, eventids, competitors, standings)
+    for key in competitors:
+        if key not in entries:
+            if key in standings:
+                db.session.delete(standings.pop(key))
+            continue
+        sr = entries[key]
+        sr['score'], sr['scores'] = _calculateSeriesScore(series, sr['results'].values())
+        if key not in standings:
+            standings[key] = SeriesStanding(series.id, sc.id, key, sr['name'], sr.get('club'))
+            db.session.add(standings[key])
+        _setStanding(standings[key], sr)
+
+    ranked = _assignSeriesClassPositions(series, [_standingResult(st) for st in standings.values()])
+    for sr in ranked:
+        sr['standing'].position = sr['position']
+    db.session.flush()
+    return list(standings.values())
+
+def _changedEntries(sc, eventids, competitors, standings):
+    """
+    Series class entries, as _seriesClassEntries gives them, of competitors
+    {competitor key: [changed results]}, their other results from standings
+    """
+    entries = {}
+    for key, results in competitors.items():
+        if key in standings:
+            st = standings[key]
+            sr = {'key':key, 'name':st.name, 'club':st.club, 'results':{x:False for x in eventids}}
+            sr['results'].update(_savedResults(st, eventids))
+        else:
+            r = results[0]
+            sr = {'key':key, 'results':{x:False for x in eventids}}
+            if sc.classtype == 'indv':
+                sr.update(name=r.name, club=r.club_shortname)
+            else:
+                sr.update(name=r.teamname_short)
+        for r in results:
+            if r.eventid in sr['results'] and not (sc.classtype == 'indv' and r.resultstatus == 'nc'):
+                sr['results'][r.eventid] = r
+        if any(x is not False for x in sr['results'].values()):
+            entries[key] = sr
+    return entries
+
+def _savedResults(standing, eventids):
+    """{eventid: EventScore} saved on a standing, for the events still in the series"""
+    saved = ((int(eid), EventScore(*x)) for eid, x in json.loads(standing.results).items())
+    return {eid: x for eid, x in saved if eid in eventids}
+
+def _standingResult(standing):
+    """A saved standing as the score fields of a series result"""
+    return {'score': standing.score if standing.score is not None else False,
+            'scores': json.loads(standing.tiebreak) if standing.tiebreak is not None else False,
+            'standing': standing}
+
+def _seriesClassStandings(sc, eventids, standings=None):
+    """Series results for a class page from the saved standings, by position then competitor
+
+    Pass the class's standings if they are loaded already.
+    """
+    if standings is None:
+        standings = SeriesStanding.query.filter_by(seriesclassid=sc.id). \
+                        order_by(SeriesStanding.position, SeriesStanding.competitor).all()
+    else:
+        standings = sorted(standings, key=lambda st: (st.position, st.competitor))
+    entries = {}
+    if any(st.results is None for st in standings):
+        # saved before standings kept their event results
+        entries = _seriesClassEntries(sc, eventids)
+    scresults = []
+    for st in standings:
+        sr = {'key':st.competitor, 'name':st.name, 'club':st.club, 'results':{x:False for x in eventids}}
+        if st.results is not None:
+            sr['results'].update(_savedResults(st, eventids))
+        else:
+            sr = entries.get(st.competitor, sr)
+        sr.update(_standingResult(st))
+        sr['position'] = st.position
+        scresults.append(sr)
+    return scresults
+
+def _similarNames(names, threshold=DUPLICATE_NAME_RATIO):
+    """
+    Index pairs (i, j) of names with fuzz.ratio above threshold, in the
+    order itertools.combinations would give them.
+
+    fuzz.ratio is 200 * M / (len1 + len2) rounded, where M matched
+    characters can't be more than C, the characters both names share
+    counting repeats. A pair needs C >= a * (len1 + len2), and so
+    C >= b * len for either name. Any two names sharing b * len of their
+    characters share one of the len - ceil(b * len) + 1 rarest characters
+    of each name (prefix filtering), so only names sharing one of those
+    are candidates, and only candidates with enough characters in common
+    are scored. Every pair all-pairs comparison would find is found.
+    """
+    import numpy as np
+    from fuzzywuzzy import fuzz
+    a = (threshold + 0.5) / 200.0
+    b = a / (1 - a)
+    # each character occurrence is a token, so 'anna' is a1 n1 n2 a2
+    tokens = []
+    for name in names:
+        seen = Counter()
+        nametokens = []
+        for ch in (name or ''):
+            seen[ch] += 1
+            nametokens.append((ch, seen[ch]))
+        tokens.append(nametokens)
+    frequency = Counter(t for nametokens in tokens for t in nametokens)
+
+    # character counts, one row per name, for C of many pairs at once
+    columns = {ch: k for k, ch in enumerate(sorted(set(ch for ch, n in frequency)))}
+    counts = np.zeros((len(names), len(columns)), dtype=np.int16)
+    for j, nametokens in enumerate(tokens):
+        for ch, n in nametokens:
+            counts[j, columns[ch]] = n
+    lengths = counts.sum(axis=1)
+
+    index = {}
+    empty = []
+    pairs = []
+    for j, nametokens in enumerate(tokens):
+        if names[j] == '':
+            # fuzz.ratio scores equal names 100 before it checks for empty ones
+            pairs.extend((i, j) for i in empty)
+            empty.append(j)
+        nametokens.sort(key=lambda t: (frequency[t], t))
+        prefix = nametokens[:len(nametokens) - int(math.ceil(b * len(nametokens) - 1e-9)) + 1]
+        candidates = set()
+        for t in prefix:
+            postings = index.setdefault(t, [])
+            candidates.update(postings)
+            postings.append(j)
+        if not candidates:
+            continue
+        candidates = np.fromiter(candidates, dtype=int, count=len(candidates))
+        common = np.minimum(counts[candidates], counts[j]).sum(axis=1)
+        candidates = candidates[common >= a * (lengths[candidates] + lengths[j])]
+        pairs.extend((int(i), j) for i in candidates if fuzz.ratio(names[i], names[j]) > threshold)
+    pairs.sort()
+    return pairs
+
 def _calculateSeriesScore(series, results):
-    results = [x for x in results if (isinstance(x, PersonResult) or isinstance(x, TeamResult)) and (x.score is not None)]
+    # an event result, its score as saved on a standing, or False
+    results = [x for x in results if (x is not False) and (x.score is not None)]
     # TODO: need to detect if good scores are high or low (!)
     results.sort(key=lambda x: -x.score)
     scores = [x.score for x in results[:series.scoreeventscount]]
@@ -294,72 +601,43 @@ def _calculateSeriesScore(series, results):
         tiebreakscores = []
     return score, tiebreakscores
 
-def cmp_to_key(mycmp):
-    'Convert a cmp= function into a key= function'
-    class K:
-        def __init__(self, obj, *args):
-            self.obj = obj
-        def __lt__(self, other):
-            return mycmp(self.obj, other.obj) < 0
-        def __gt__(self, other):
-            return mycmp(self.obj, other.obj) > 0
-        def __eq__(self, other):
-            return mycmp(self.obj, other.obj) == 0
-        def __le__(self, other):
-            return mycmp(self.obj, other.obj) <= 0
-        def __ge__(self, other):
-            return mycmp(self.obj, other.obj) >= 0
-        def __ne__(self, other):
-            return mycmp(self.obj, other.obj) != 0
-    return K
-
 def _assignSeriesClassPositions(series, seriesclassresults):
-    seriesclassresults = sorted(seriesclassresults, key=cmp_to_key(sortSeriesResults))
-    seriesclassresults.reverse()
-    nextpos = 1
-    tied = 0
-    seriesclassresults[0]['position'] = nextpos
-    for i in range(1, len(seriesclassresults)):
-        if sortSeriesResults(seriesclassresults[i-1], seriesclassresults[i]) != 0:
-            # not tied, increment position by 1 plus previous ties
-            nextpos += 1
-            nextpos += tied
-            tied = 0
+    """Sort a series class best first and assign positions, ties share a place"""
+    keyed = sorted([(_seriesResultKey(r), r) for r in seriesclassresults], key=lambda x: x[0])
+    keyed.reverse()
+    for i in range(len(keyed)):
+        if i > 0 and keyed[i][0] == keyed[i-1][0]:
+            keyed[i][1]['position'] = keyed[i-1][1]['position']
         else:
-            # tied, next gets same pos, increment tied counter
-            tied += 1
-        seriesclassresults[i]['position'] = nextpos
-    return seriesclassresults
-
+            keyed[i][1]['position'] = i + 1
+    return [r for key, r in keyed]
 
-def sortSeriesResults(a, b):
-    if a['score'] is None or b['score'] is None:
+def _seriesResultKey(result):
+    """
+    Sort key for a series result, higher is better: the series score, then
+    the tiebreak scores in order. Tiebreak scores are compared one at a
+    time, both scoring 0 at the same place is a tie, and running out of
+    scores loses to any remaining score. Each tiebreak score is encoded so
+    plain tuple comparison follows those rules:
+        (3, score) for a positive score
+        (2,) for a zero score, which ends the key
+        (1, score) for a negative score
+        (0,) when the scores run out
+    """
+    if result['score'] is None:
         raise KeyError('missing score value')
-    elif a['score'] > b['score']:
-        return 1
-    elif b['score'] > a['score']:
-        return -1
-    elif a['score'] == b['score']:
-        return sortTiedSeriesResults(a, b)
-
-def sortTiedSeriesResults(a, b):
-    a_scores = a['scores'][:]
-    b_scores = b['scores'][:]
-    while a_scores and b_scores:
-        a, b = a_scores.pop(0), b_scores.pop(0)
-        if a > b:
-            return 1
-        elif b > a:
-            return -1
-        elif a == 0 and b == 0:
-            return 0
-
-    if a_scores and not b_scores:
-        return 1
-    elif b_scores and not a_scores:
-        return -1
+    tiebreak = []
+    for score in (result['scores'] or []):
+        if score > 0:
+            tiebreak.append((3, score))
+        elif score < 0:
+            tiebreak.append((1, score))
+        else:
+            tiebreak.append((2,))
+            break
     else:
-        return 0
+        tiebreak.append((0,))
+    return (result['score'], tuple(tiebreak))
 
 def verifyScoringMethods(seriesclasslist):
     """Flashes a message if events comprising a series class use
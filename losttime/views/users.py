@@ -5,11 +5,13 @@ import flask_login
 from losttime.models import db, User, Event, Series
 from losttime.mailman import send_email
 from losttime import app
+from losttime.querycount import query_budget
 
 users = Blueprint("users", __name__, static_url_path='/')
 
 @users.route("/me", methods=['GET'])
 @flask_login.login_required
+@query_budget(8)
 def user_home():
     ltuser = flask_login.current_user
     if not ltuser.isVerified: